@@ -3,15 +3,28 @@ from omni_python_sdk import OmniAPI
 from dotenv import load_dotenv
 import os
 import pandas as pd
-import json
-import requests
+import pyarrow as pa
+import hashlib
 import random
-import csv
-
-# Load API key and base url from .env
-load_dotenv()
-api_key = os.getenv("OMNI_API_KEY")
-base_url = os.getenv("OMNI_BASE_URL")
+import logging
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from omni_http import OmniHTTPClient
+from query_cache import QueryCache
+from concurrency import ConcurrencyController
+from evaluation import (Evaluator, SharedExecutions, compile_case, diff_results, extract_model_id_from_url,
+                        model_label)
+from compiled_suite import SUITE_EXTENSION, CsvSuite, compile_suite, load_suite, open_suite
+from evaluation_store import HISTORY_COLUMNS, EvaluationStore, ResultBlobStore
+from suite_jobs import JobManager
+from metrics import METRICS, percentiles, write_metrics
+
+@st.cache_resource
+def load_config():
+    """Load the API key and base URL from .env once per process rather than on every rerun."""
+    load_dotenv()
+    return os.getenv("OMNI_API_KEY"), os.getenv("OMNI_BASE_URL")
+
+api_key, base_url = load_config()
 
 if not api_key:
     st.error("Please set OMNI_API_KEY in your .env file")
@@ -31,19 +44,33 @@ DATASET = {
 st.set_page_config(page_title="Blobby's Evaluation Suite", page_icon="🤖", layout="wide")
 st.title("Blobby's Evaluation Suite 🤖🧪")
 
-def extract_model_id_from_url(url):
-    """Extract model ID from Omni URL."""
-    try:
-        # Split by /models/ and take the second part
-        model_part = url.split('/models/')[1]
-        # Take everything before the next slash or end of string
-        model_id = model_part.split('/')[0]
-        return model_id
-    except:
-        return None
+class StreamlitLogHandler(logging.Handler):
+    """Show evaluation warnings and errors on the page whose script run produced them."""
+
+    def emit(self, record):
+        if get_script_run_ctx(suppress_warning=True) is None:
+            # Not from a script run (e.g. a background job's thread), so print it as if this
+            # handler weren't attached; jobs keep their own messages for the progress view
+            logging.lastResort.handle(record)
+            return
+        message = self.format(record)
+        st.error(message) if record.levelno >= logging.ERROR else st.warning(message)
+
+@st.cache_resource
+def install_log_handler():
+    """Attach the Streamlit handler to the evaluation logger once per process."""
+    handler = StreamlitLogHandler()
+    logging.getLogger("evaluation").addHandler(handler)
+    return handler
+
+install_log_handler()
 
-# Initialize Omni client
-client = OmniAPI(api_key, base_url=base_url)
+@st.cache_resource
+def get_omni_client(api_key, base_url):
+    """Shared Omni SDK client, built once per process."""
+    return OmniAPI(api_key, base_url=base_url)
+
+client = get_omni_client(api_key, base_url)
 
 # Environment configuration
 st.sidebar.header("⚙️ Configuration")
@@ -55,22 +82,329 @@ topic_name = st.sidebar.text_input("Topic Name",
 st.session_state['topic_name'] = topic_name
 
 # Model configuration
-model_a_url = st.sidebar.text_input("Model A URL", 
-                                   value="https://partners.omniapp.co/models/7f250d4f-75bd-45ab-a58d-22db81174793/ide/model?mode=combined",
-                                   help="Enter the Omni URL from the IDE for the first model you want to evaluate")
-model_b_url = st.sidebar.text_input("Model B URL", 
-                                   value="https://partners.omniapp.co/models/e29c35ca-39f6-4a6b-bcb8-0bfc8f5be64b/ide/model?mode=combined",
-                                   help="Enter the Omni URL from the IDE for the first model you want to evaluate")
-
-# Extract model IDs from URLs
-model_1_id = extract_model_id_from_url(model_a_url)
-model_2_id = extract_model_id_from_url(model_b_url)
-
-if not model_1_id:
-    st.sidebar.error("Invalid URL format for Model A. Please enter a valid Omni model URL.")
-
-if not model_2_id:
-    st.sidebar.error("Invalid URL format for Model B. Please enter a valid Omni model URL.")
+DEFAULT_MODEL_URLS = [
+    "https://partners.omniapp.co/models/7f250d4f-75bd-45ab-a58d-22db81174793/ide/model?mode=combined",
+    "https://partners.omniapp.co/models/e29c35ca-39f6-4a6b-bcb8-0bfc8f5be64b/ide/model?mode=combined"
+]
+model_count = st.sidebar.number_input("Number of Models", min_value=1, max_value=10, value=2,
+                                      help="How many model branches to compare")
+
+# (label, model ID) for every model with a valid URL
+models = []
+for i in range(model_count):
+    label = model_label(i)
+    model_url = st.sidebar.text_input(f"{label} URL",
+                                      value=DEFAULT_MODEL_URLS[i] if i < len(DEFAULT_MODEL_URLS) else "",
+                                      help=f"Enter the Omni URL from the IDE for {label}")
+    model_id = extract_model_id_from_url(model_url)
+    if not model_id:
+        st.sidebar.error(f"Invalid URL format for {label}. Please enter a valid Omni model URL.")
+    else:
+        models.append((label, model_id))
+
+# Suite execution settings
+max_in_flight = st.sidebar.number_input("Max Concurrent Requests",
+                                        min_value=1, max_value=64,
+                                        value=st.session_state.get('max_in_flight', 8),
+                                        help="Maximum number of model queries the test suite runs at the same time")
+st.session_state['max_in_flight'] = max_in_flight
+worker_processes = st.sidebar.number_input("Worker Processes", min_value=1, max_value=max(1, os.cpu_count() or 1) * 2,
+                                           value=1, help="Split large suites across this many processes; each "
+                                                         "runs up to Max Concurrent Requests queries at a time")
+
+with st.sidebar.expander("Request Settings"):
+    read_timeout = st.number_input("Read Timeout (s)", min_value=1, max_value=600, value=120,
+                                   help="How long to wait for Omni to generate a query before giving up")
+    max_retries = st.number_input("Max Retries", min_value=0, max_value=10, value=3,
+                                  help="Retries for rate-limited (429) and server error (5xx) responses")
+    adaptive = st.checkbox("Adaptive Concurrency", value=True,
+                           help="Start below Max Concurrent Requests and adjust each endpoint and model's limit "
+                                "to Omni's latency, errors and 429s")
+
+@st.cache_resource
+def get_http_client(base_url, api_key, pool_size, read_timeout, max_retries):
+    """Shared HTTP client so connections stay alive across queries and reruns."""
+    return OmniHTTPClient(base_url, api_key, pool_size=pool_size,
+                          read_timeout=read_timeout, max_retries=max_retries)
+
+http_client = get_http_client(base_url, api_key, max_in_flight, read_timeout, max_retries)
+
+@st.cache_resource
+def get_query_cache():
+    """Process-wide cache of generated queries and their results."""
+    return QueryCache()
+
+query_cache = get_query_cache()
+
+@st.cache_resource
+def get_concurrency_controller():
+    """Process-wide adaptive limits, so what they've learned carries over between runs."""
+    return ConcurrencyController()
+
+concurrency = get_concurrency_controller()
+concurrency.set_max(max_in_flight)
+
+with st.sidebar.expander("Cache Settings"):
+    bypass_cache = st.checkbox("Bypass Cache", value=False,
+                               help="Always call Omni; fresh queries and results still refresh the cache")
+    cache_ttl_hours = st.number_input("Cache TTL (hours)", min_value=0, max_value=24 * 30, value=0,
+                                      help="Expire cached entries after this many hours (0 = never)")
+    query_cache.ttl = cache_ttl_hours * 3600 or None
+    cache_stats = query_cache.stats
+    st.caption(f"Queries: {cache_stats['query_hits']} hits / {cache_stats['query_misses']} misses  \n"
+               f"Results: {cache_stats['result_hits']} hits / {cache_stats['result_misses']} misses")
+    if st.button("Clear Cache"):
+        query_cache.clear()
+        st.rerun()
+
+@st.cache_resource
+def get_store(path):
+    """Persistent evaluation history shared by every session."""
+    return EvaluationStore(path)
+
+# Uploaded suites and their compiled copies, keyed by the hash of the upload
+SUITE_DIR = ".cache/suites"
+CASES_PER_PAGE = 20
+os.makedirs(SUITE_DIR, exist_ok=True)
+
+db_path = os.getenv("EVAL_DB_PATH", "evaluations.db")
+store = get_store(db_path)
+
+@st.cache_resource
+def get_job_manager(path, metrics_path):
+    """Background suite jobs, shared so reruns and reloaded pages can attach to them.
+
+    If metrics_path is set, each finished suite run's metrics are exported there (.prom or .json).
+    """
+    job_store = get_store(path)
+
+    def on_finish(job):
+        # Replays have no suite metrics, and exporting them would overwrite the last suite run's
+        if job.kind == "suite":
+            write_metrics(job_store, metrics_path, run_id=job.run_id)
+
+    return JobManager(job_store, on_finish=on_finish if metrics_path else None)
+
+job_manager = get_job_manager(db_path, os.getenv("EVAL_METRICS_PATH"))
+
+@st.cache_resource
+def get_result_blobs(path):
+    """Saved suite results, referenced from history records by ID."""
+    return ResultBlobStore(path)
+
+result_blobs = get_result_blobs(os.getenv("EVAL_RESULTS_DIR", "results"))
+
+# Results stay as Arrow tables; only this many rows are ever converted to pandas for display
+DISPLAY_ROWS = 1000
+
+def show_table(table):
+    """Render the first DISPLAY_ROWS rows of an Arrow table, numbered from 1."""
+    df = table.slice(0, DISPLAY_ROWS).to_pandas()
+    df.index = range(1, len(df) + 1)
+    st.dataframe(df, use_container_width=True)
+    if table.num_rows > DISPLAY_ROWS:
+        st.caption(f"Showing the first {DISPLAY_ROWS} of {table.num_rows} rows")
+
+def make_evaluator(topic):
+    # worker_config lets sharded runs rebuild the same evaluator in worker processes
+    worker_config = {"base_url": base_url, "api_key": api_key, "topic_name": topic, "pool_size": max_in_flight,
+                     "read_timeout": read_timeout, "max_retries": max_retries,
+                     "cache_dir": query_cache.cache_dir, "cache_ttl": query_cache.ttl,
+                     "bypass_cache": bypass_cache, "results_dir": result_blobs.path,
+                     "adaptive": adaptive}
+    return Evaluator(http_client, client, topic, cache=query_cache, bypass_cache=bypass_cache,
+                     blobs=result_blobs, worker_config=worker_config, limits=concurrency if adaptive else None)
+
+evaluator = make_evaluator(topic_name)
+
+def format_summary(counters, kind, index):
+    """Turn summary counters into the Evaluation Results table."""
+    counters = counters.set_index(index)
+    latency = (counters["latency_sum"] / counters["latency_count"].where(counters["latency_count"] > 0))
+    if kind == "suite":
+        return pd.DataFrame({
+            "Total Tests": counters["total"],
+            "Passed": counters["passed"],
+            "Failed": counters["failed"],
+            "Pass Rate %": (counters["passed"] / counters["total"] * 100).map(lambda x: f"{x:.1f}%"),
+            "Avg Latency (s)": latency.map(lambda x: f"{x:.2f}"),
+            "Max Latency (s)": counters["latency_max"].astype(float).map(lambda x: f"{x:.2f}"),
+            "Shared Executions": counters["shared"],
+            "Reused": counters["reused"],
+            "Re-run": counters["total"] - counters["reused"]
+        })
+    if kind == "replay":
+        # Replay records compare two models, and fail when their results disagree
+        return pd.DataFrame({
+            "Prompts Compared": counters["total"],
+            "Agree": counters["passed"],
+            "Disagree": counters["failed"],
+            "Disagreement %": (counters["failed"] / counters["total"] * 100).map(lambda x: f"{x:.1f}%")
+        })
+    return pd.DataFrame({
+        "Total Evaluations": counters["total"],
+        "👍 Count": counters["thumbs_up"],
+        "👎 Count": counters["thumbs_down"],
+        "Net Positive %": (counters["thumbs_up"] / counters["total"] * 100).map(lambda x: f"{x:.1f}%")
+    })
+
+def show_job_errors(job):
+    """Failed task count and recent warnings and errors for a suite or replay job."""
+    if job.failed:
+        unit = "prompts couldn't be compared" if job.kind == "replay" else "queries failed"
+        st.error(f"{job.failed} {unit}")
+    messages = job.messages
+    if messages:
+        with st.expander(f"Recent errors and warnings ({len(messages)})", expanded=bool(job.failed)):
+            st.code("\n".join(reversed(messages[-20:])), language=None)
+
+def show_sample_stats(job):
+    """What sampling a replay job's prompt log found, once it's done."""
+    stats = job.sample_stats
+    if stats:
+        st.caption(f"Read {stats.get('lines', 0)} log records: {stats.get('unique', 0)} unique prompts, "
+                   f"{stats.get('duplicates', 0)} duplicates, {stats.get('invalid', 0)} skipped; "
+                   f"sampled {stats['sampled']} from {stats['strata']} strata")
+
+@st.fragment(run_every=1)
+def show_job_progress(run_id):
+    """Poll a background suite or replay job, showing its progress and the results so far."""
+    job = job_manager.get(run_id)
+    if job is None:
+        st.session_state.pop('active_run_id', None)
+        return
+
+    st.markdown("### Replaying Prompts..." if job.kind == "replay" else "### Running Tests...")
+    if job.status == "sampling":
+        st.progress(0.0, text="Sampling prompt log...")
+    else:
+        st.progress(job.completed / job.total if job.total else 1.0,
+                    text=f"{job.completed} of {job.total} {'prompts' if job.kind == 'replay' else 'queries'} "
+                         f"complete, {job.failed} failed ({job.status})")
+    show_sample_stats(job)
+    show_job_errors(job)
+    counters = store.summary(kind=job.kind, run_id=run_id)
+    if not counters.empty:
+        st.dataframe(format_summary(counters, job.kind, ["model", "model_id"]).astype(str))
+
+    limits = pd.DataFrame(concurrency.snapshot())
+    if not limits.empty and job.processes == 1:
+        with st.expander("Concurrency"):
+            st.caption("Current limit per endpoint and model; limits are cut on 429s, errors and slow responses")
+            st.dataframe(limits.astype(str), use_container_width=True)
+            if concurrency.events:
+                st.markdown("**Recent throttle events**")
+                st.dataframe(pd.DataFrame(list(concurrency.events)[::-1][:20]).astype(str), use_container_width=True)
+
+    pause_col, cancel_col = st.columns(2)
+    if job.status == "paused":
+        if pause_col.button("▶️ Resume"):
+            job.resume()
+    elif pause_col.button("⏸️ Pause", disabled=job.status != "running"):
+        job.pause()
+    # Cancelling while sampling stops the job as soon as the sample is drawn
+    if cancel_col.button("⏹️ Cancel", disabled=job.status not in ("running", "paused", "sampling")):
+        job.cancel()
+
+    if not job.running:
+        # Refresh the whole page so the history picks up the finished run
+        st.session_state.pop('active_run_id', None)
+        st.session_state['finished_run'] = (run_id, job.status, job.error, job.kind)
+        st.rerun()
+
+
+# Results, feedback and history are fragments, so interacting with one of them reruns only
+# that section rather than the whole page with every result table and the history
+@st.fragment
+def show_manual_results(manual_models):
+    """Result tables and query details for the last manual prompt, one column per model."""
+    cols = st.columns(min(len(manual_models), 3))
+    for i, (label, model_id) in enumerate(manual_models):
+        with cols[i % len(cols)]:
+            st.markdown(f"### {label} Results")
+            table, query = st.session_state.manual_results[label]
+
+            if table is not None:
+                try:
+                    show_table(table)
+                except Exception as e:
+                    st.error(f"Error displaying results: {str(e)}")
+                    st.write("Raw data:", table.slice(0, DISPLAY_ROWS).to_pylist())
+                
+                with st.expander("Query Details"):
+                    if query and "query" in query:
+                        query_details = query["query"]
+                        filtered_query = {
+                            "fields": query_details.get("fields", []),
+                            "filters": query_details.get("filters", {}),
+                            "limit": query_details.get("limit"),
+                            "sort": query_details.get("sorts", [])
+                        }
+                        # Remove None values and empty lists/dicts
+                        filtered_query = {k: v for k, v in filtered_query.items() if v not in [None, [], {}, ""]}
+                        st.json(filtered_query)
+
+@st.fragment
+def feedback_form(manual_models):
+    """Rating and note per model for the last manual prompt."""
+    st.markdown("### Feedback")
+    cols = st.columns(min(len(manual_models), 3))
+    feedback = {}
+    for i, (label, model_id) in enumerate(manual_models):
+        with cols[i % len(cols)]:
+            st.write(f"**{label} Rating**")
+            rating = st.radio(f"{label} Rating", ["👍", "👎"], key=f"rating_{label}", horizontal=True,
+                              label_visibility="collapsed")
+            note = st.text_area(f"Feedback for {label}:", key=f"note_{label}")
+            feedback[label] = (model_id, rating, note)
+
+    if st.session_state.pop("feedback_submitted", False):
+        st.success("Feedback submitted!")
+    if st.button("Submit Feedback", key="submit_feedback_combined"):
+        store.append_many([{
+            "timestamp": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "model": label,
+            "model_id": model_id,
+            "prompt": st.session_state.manual_prompt,
+            "feedback": rating,
+            "note": note
+        } for label, (model_id, rating, note) in feedback.items() if rating])
+        # Rerun the whole page so the history includes the new feedback
+        st.session_state.feedback_submitted = True
+        st.rerun()
+
+@st.cache_data(max_entries=10 * CASES_PER_PAGE, show_spinner=False)
+def parse_expected_answer(question, answer):
+    """Parsed expected answer of a streamed test case, cached so paging back and forth doesn't re-parse."""
+    return (compile_case(question, answer) or {}).get('parsed_response')
+
+@st.fragment
+def show_test_cases(questions):
+    """The loaded test cases, one page at a time."""
+    st.markdown("### Test Cases")
+    case_pages = max(1, -(-len(questions) // CASES_PER_PAGE))
+    case_page = st.number_input(f"Test case page (of {case_pages}, {len(questions)} test cases)",
+                                min_value=1, max_value=case_pages, value=1) if case_pages > 1 else 1
+    offset = (case_page - 1) * CASES_PER_PAGE
+    page_cases = (questions[offset:offset + CASES_PER_PAGE] if isinstance(questions, list)
+                  else questions.page(offset, CASES_PER_PAGE))
+    for i, q in enumerate(page_cases, start=offset):
+        with st.expander(f"Test Case {i+1}"):
+            st.write(f"**Question:** {q['question']}")
+            st.write("**Expected Response:**")
+            # Streamed cases are only parsed for the page being shown
+            parsed_response = (q['parsed_response'] if 'parsed_response' in q
+                               else parse_expected_answer(q['question'], q['expected_response']))
+            if isinstance(parsed_response, pa.Table):
+                show_table(parsed_response)
+            else:
+                st.write(q['expected_response'])
+            if isinstance(questions, list) and st.button(f"Remove Test Case {i+1}"):
+                questions.pop(i)
+                st.rerun()
+    if not isinstance(questions, list) and st.button("Clear Test Cases"):
+        st.session_state.evaluation_suite["questions"] = []
+        st.rerun()
 
 # Mode selection using tabs
 manual_tab, automated_tab, prompt_log_tab = st.tabs(["Manual Evaluation", "Automated Evaluation", "Production Monitoring"])
@@ -79,134 +413,12 @@ manual_tab, automated_tab, prompt_log_tab = st.tabs(["Manual Evaluation", "Autom
 if "evaluation_suite" not in st.session_state:
     st.session_state.evaluation_suite = {
         "questions": [],
-        "current_question": 0,
-        "running": False
+        "current_question": 0
     }
 
-for key in ["feedback_a", "feedback_b", "evaluations", 
-            "model_a_result", "model_a_query", "model_b_result", "model_b_query"]:
-    if key not in st.session_state:
-        if key in ["feedback_a", "feedback_b"]:
-            st.session_state[key] = {"rating": None, "note": "", "submitted": False}
-        elif key == "evaluations":
-            st.session_state[key] = []
-        else:
-            st.session_state[key] = None
-
-def parse_expected_response(response_str):
-    """Parse expected response string into either a single value or dataframe."""
-    try:
-        # First try to parse as JSON
-        try:
-            data = json.loads(response_str)
-            if isinstance(data, dict):
-                # Create DataFrame preserving original column names
-                df = pd.DataFrame(data)
-                return df
-            elif isinstance(data, list):
-                # Create DataFrame from list of dicts preserving original column names
-                df = pd.DataFrame(data)
-                return df
-        except json.JSONDecodeError:
-            pass
-        
-        # Try to parse as CSV
-        try:
-            # StringIO to simulate file for read_csv
-            from io import StringIO
-            df = pd.read_csv(StringIO(response_str))
-            return df
-        except:
-            pass
-        
-        # If not JSON or CSV, treat as single value
-        return response_str
-    except Exception as e:
-        st.error(f"Error parsing expected response: {str(e)}")
-        return None
-
-def compare_results(result_df, expected_response):
-    """Compare query results with expected response."""
-    try:
-        # If expected response is a dataframe
-        if isinstance(expected_response, pd.DataFrame):
-            # Check if same number of rows
-            if result_df.shape[0] != expected_response.shape[0]:
-                return False
-            
-            # Convert both dataframes to sets of tuples for order-independent comparison
-            # First sort each dataframe's columns alphabetically
-            result_cols = sorted(result_df.columns)
-            expected_cols = sorted(expected_response.columns)
-            
-            # Check if same columns exist (ignoring order)
-            if set(result_cols) != set(expected_cols):
-                return False
-            
-            # Convert each row to a tuple of values, sorted by column name
-            result_rows = {tuple(sorted(row.items())) for _, row in result_df[result_cols].to_dict('index').items()}
-            expected_rows = {tuple(sorted(row.items())) for _, row in expected_response[expected_cols].to_dict('index').items()}
-            
-            # Compare the sets of rows
-            return result_rows == expected_rows
-            
-        # If result is a single value
-        elif result_df.shape == (1, 1):
-            return str(result_df.iloc[0, 0]) == str(expected_response)
-        else:
-            st.warning("Result is a dataframe but expected response is not. Cannot compare directly.")
-            return False
-    except Exception as e:
-        st.error(f"Comparison error: {str(e)}")
-        return False
-
-def query_data(prompt, model_id):
-    try:
-        if not prompt or not model_id:
-            st.error("Missing prompt or model ID")
-            return None, None
-
-        data = {
-            "currentTopicName": st.session_state['topic_name'],
-            "modelId": model_id,
-            "prompt": prompt
-        }
-        
-        response = requests.post(
-            f"{base_url}/api/unstable/ai/generate-query",
-            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
-            json=data
-        )
-        
-        if response.status_code != 200:
-            st.error(f"API Error: {response.status_code}")
-            return None, None
-
-        query_dict = response.json()
-        if not query_dict:
-            st.error("Empty response from API")
-            return None, None
-            
-        query_result = client.run_query_blocking(query_dict)
-        if query_result is None:
-            st.error("No query result returned")
-            return None, None
-
-        result, _ = query_result
-        if result is None:
-            st.error("Query result is None")
-            return None, None
-            
-        df = result.to_pandas()
-        if df is None or df.empty:
-            st.warning("Query returned empty result")
-            return pd.DataFrame(), query_dict
-            
-        return df, query_dict
-
-    except Exception as e:
-        st.error(f"Error in query_data: {str(e)}")
-        return None, None
+# Manual tab results per model label: (result table, query dict)
+if "manual_results" not in st.session_state:
+    st.session_state.manual_results = {}
 
 # Manual Evaluation
 with manual_tab:
@@ -217,82 +429,17 @@ with manual_tab:
 
     # --- Query Flow ---
     if submitted and prompt.strip():
-        st.session_state.model_a_result, st.session_state.model_a_query = query_data(prompt, model_1_id)
-        st.session_state.model_b_result, st.session_state.model_b_query = query_data(prompt, model_2_id)
+        # Models that generate the same query share one execution
+        shared = SharedExecutions()
+        st.session_state.manual_results = {label: evaluator.query_data(prompt, model_id, shared=shared)
+                                           for label, model_id in models}
+        st.session_state.manual_prompt = prompt
 
     # Show results if we have them
-    if st.session_state.model_a_result is not None or st.session_state.model_b_result is not None:
-        col1, col2 = st.columns(2)
-
-        for label, model_id, df_key, query_key, feedback_key, col in [
-            ("Model A", model_1_id, "model_a_result", "model_a_query", "feedback_a", col1),
-            ("Model B", model_2_id, "model_b_result", "model_b_query", "feedback_b", col2)
-        ]:
-            with col:
-                st.markdown(f"### {label} Results")
-                df = st.session_state[df_key]
-                query = st.session_state[query_key]
-
-                if df is not None:
-                    try:
-                        # Reset index to start at 1
-                        df.index = range(1, len(df) + 1)
-                        # Convert DataFrame to a format Streamlit can safely display
-                        display_df = df.fillna('')  # Replace NaN with empty string
-                        st.dataframe(display_df, use_container_width=True)
-                    except Exception as e:
-                        st.error(f"Error displaying results: {str(e)}")
-                        st.write("Raw data:", df.to_dict())
-                    
-                    with st.expander("Query Details"):
-                        if query and "query" in query:
-                            query_details = query["query"]
-                            filtered_query = {
-                                "fields": query_details.get("fields", []),
-                                "filters": query_details.get("filters", {}),
-                                "limit": query_details.get("limit"),
-                                "sort": query_details.get("sorts", [])
-                            }
-                            # Remove None values and empty lists/dicts
-                            filtered_query = {k: v for k, v in filtered_query.items() if v not in [None, [], {}, ""]}
-                            st.json(filtered_query)
-
-        st.markdown("### Feedback")
-        col1, col2 = st.columns(2)
-        with col1:
-            st.write("**Model A Rating**")
-            rating_a = st.radio("Model A Rating", ["👍", "👎"], key="rating_a", horizontal=True, label_visibility="collapsed")
-            st.session_state.feedback_a["rating"] = rating_a if rating_a != "No rating" else None
-            note_a = st.text_area("Feedback for Model A:", value=st.session_state.feedback_a["note"], key="note_a")
-            st.session_state.feedback_a["note"] = note_a
-
-        with col2:
-            st.write("**Model B Rating**")
-            rating_b = st.radio("Model B Rating", ["👍", "👎"], key="rating_b", horizontal=True, label_visibility="collapsed")
-            st.session_state.feedback_b["rating"] = rating_b if rating_b != "No rating" else None
-            note_b = st.text_area("Feedback for Model B:", value=st.session_state.feedback_b["note"], key="note_b")
-            st.session_state.feedback_b["note"] = note_b
-
-        if st.button("Submit Feedback", key="submit_feedback_combined"):
-            if st.session_state.feedback_a["rating"]:
-                st.session_state.evaluations.append({
-                    "timestamp": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "model": "Model A",
-                    "model_id": model_1_id,
-                    "prompt": prompt,
-                    "feedback": st.session_state.feedback_a["rating"],
-                    "note": note_a
-                })
-            if st.session_state.feedback_b["rating"]:
-                st.session_state.evaluations.append({
-                    "timestamp": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "model": "Model B",
-                    "model_id": model_2_id,
-                    "prompt": prompt,
-                    "feedback": st.session_state.feedback_b["rating"],
-                    "note": note_b
-                })
-            st.success("Feedback submitted!")
+    manual_models = [(label, model_id) for label, model_id in models if label in st.session_state.manual_results]
+    if any(st.session_state.manual_results[label][0] is not None for label, _ in manual_models):
+        show_manual_results(manual_models)
+        feedback_form(manual_models)
 
 # Automated Evaluation
 with automated_tab:
@@ -302,33 +449,44 @@ with automated_tab:
     input_method = st.radio("Choose input method:", ["Upload CSV", "Manual Entry"], horizontal=True)
     
     if input_method == "Upload CSV":
-        st.markdown("""Upload a CSV file with test cases. The CSV should have two columns:
+        st.markdown(f"""Upload a CSV file with test cases. The CSV should have two columns:
         1. **Question**: The question to test
         2. **Answer**: The expected response (can be a single value, CSV format, or JSON)
+
+        Or upload a compiled suite (`{SUITE_EXTENSION}`) saved from an earlier load or by `python compiled_suite.py`.
         """)
         
-        uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
+        uploaded_file = st.file_uploader("Choose a CSV file", type=["csv", SUITE_EXTENSION.lstrip(".")])
         if uploaded_file is not None:
             try:
-                # Read CSV with a different delimiter since the test data contains commas
-                df = pd.read_csv(uploaded_file, delimiter=",", quoting=csv.QUOTE_MINIMAL)
-                if "Question" not in df.columns or "Answer" not in df.columns:
-                    st.error("CSV must contain 'Question' and 'Answer' columns")
+                # Uploads are kept on disk by content hash and streamed from there, so even
+                # very large suites never sit in session state
+                digest = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+                extension = SUITE_EXTENSION if uploaded_file.name.endswith(SUITE_EXTENSION) else ".csv"
+                upload_path = os.path.join(SUITE_DIR, digest + extension)
+                compiled_path = os.path.join(SUITE_DIR, digest + SUITE_EXTENSION)
+                if not os.path.exists(upload_path):
+                    with open(upload_path, "wb") as f:
+                        f.write(uploaded_file.getvalue())
+                # A CSV compiled earlier is loaded from its compiled copy
+                suite = open_suite(compiled_path if os.path.exists(compiled_path) else upload_path)
+
+                load_col, compile_col = st.columns(2)
+                if load_col.button("Load Test Cases"):
+                    # Replace existing questions with the streamed suite
+                    st.session_state.evaluation_suite["questions"] = suite
+                    st.success(f"Loaded {len(suite)} test cases!")
+                if isinstance(suite, CsvSuite):
+                    if compile_col.button("Compile Suite", help="Parse every answer now and save fingerprints, "
+                                                                "for faster comparisons and reloads"):
+                        with st.spinner("Compiling suite..."):
+                            compile_suite(((case["question"], case["expected_response"]) for case in suite), compiled_path)
+                        st.session_state.evaluation_suite["questions"] = load_suite(compiled_path)
+                        st.rerun()
                 else:
-                    if st.button("Load Test Cases"):
-                        # Clear existing questions
-                        st.session_state.evaluation_suite["questions"] = []
-                        
-                        # Add each row as a test case
-                        for _, row in df.iterrows():
-                            parsed_response = parse_expected_response(row["Answer"])
-                            if parsed_response is not None:
-                                st.session_state.evaluation_suite["questions"].append({
-                                    "question": row["Question"],
-                                    "expected_response": row["Answer"],
-                                    "parsed_response": parsed_response
-                                })
-                        st.success(f"Loaded {len(df)} test cases!")
+                    with open(compiled_path, "rb") as f:
+                        compile_col.download_button("Download Compiled Suite", f,
+                                                    file_name=os.path.splitext(uploaded_file.name)[0] + SUITE_EXTENSION)
             except Exception as e:
                 st.error(f"Error loading CSV: {str(e)}")
     
@@ -346,140 +504,240 @@ with automated_tab:
             
             if add_submitted and question and expected_response:
                 if len(st.session_state.evaluation_suite["questions"]) < 5:
-                    parsed_response = parse_expected_response(expected_response)
-                    if parsed_response is not None:
-                        st.session_state.evaluation_suite["questions"].append({
-                            "question": question,
-                            "expected_response": expected_response,
-                            "parsed_response": parsed_response
-                        })
+                    case = compile_case(question, expected_response)
+                    if case is not None:
+                        # A small uploaded suite becomes an editable list
+                        questions = list(st.session_state.evaluation_suite["questions"])
+                        st.session_state.evaluation_suite["questions"] = questions + [case]
                         st.success("Test case added!")
                 else:
                     st.error("Maximum 5 test cases allowed!")
 
-    # Display added questions
-    if st.session_state.evaluation_suite["questions"]:
-        st.markdown("### Test Cases")
-        for i, q in enumerate(st.session_state.evaluation_suite["questions"]):
-            with st.expander(f"Test Case {i+1}"):
-                st.write(f"**Question:** {q['question']}")
-                st.write("**Expected Response:**")
-                if isinstance(q['parsed_response'], pd.DataFrame):
-                    st.dataframe(q['parsed_response'])
-                else:
-                    st.write(q['expected_response'])
-                if st.button(f"Remove Test Case {i+1}"):
-                    st.session_state.evaluation_suite["questions"].pop(i)
-                    st.rerun()
+    # Display added questions, one page at a time
+    questions = st.session_state.evaluation_suite["questions"]
+    if len(questions):
+        show_test_cases(questions)
 
         # Start evaluation suite button
-        if len(st.session_state.evaluation_suite["questions"]) > 0:
-            if st.button("Run All Tests"):
-                st.session_state.evaluation_suite["running"] = True
+        if len(questions) > 0:
+            changed_only = st.checkbox("Changed only", value=False,
+                                       help="Reuse stored results for test cases and models that haven't changed "
+                                            "since they were last evaluated; run only new or changed pairs")
+            if st.button("Run All Tests", disabled='active_run_id' in st.session_state):
+                # Run every model over all questions in the background, checkpointing every task
+                job = job_manager.start(evaluator, questions,
+                                        models, max_workers=st.session_state['max_in_flight'],
+                                        processes=worker_processes, changed_only=changed_only)
+                st.session_state['active_run_id'] = job.run_id
+                st.session_state['last_run_id'] = job.run_id
                 st.rerun()
 
-    # Run evaluation suite
-    if st.session_state.evaluation_suite["running"]:
-        st.markdown("### Running Tests...")
-        progress_bar = st.progress(0)
-        
-        # Run through all questions automatically
-        for idx, question_data in enumerate(st.session_state.evaluation_suite["questions"]):
-            progress_bar.progress((idx + 1) / len(st.session_state.evaluation_suite["questions"]))
-            
-            # Query both models
-            model_a_result, model_a_query = query_data(question_data['question'], model_1_id)
-            model_b_result, model_b_query = query_data(question_data['question'], model_2_id)
-
-            # Compare results and store evaluation
-            if model_a_result is not None:
-                model_a_passed = compare_results(model_a_result, question_data['parsed_response'])
-                st.session_state.evaluations.append({
-                    "timestamp": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "model": "Model A",
-                    "model_id": model_1_id,
-                    "prompt": question_data['question'],
-                    "expected_response": question_data['expected_response'],
-                    "actual_response": model_a_result.to_csv(index=False) if isinstance(question_data['parsed_response'], pd.DataFrame) else str(model_a_result.iloc[0, 0]),
-                    "result": "✅ PASS" if model_a_passed else "❌ FAIL"
-                })
-
-            if model_b_result is not None:
-                model_b_passed = compare_results(model_b_result, question_data['parsed_response'])
-                st.session_state.evaluations.append({
-                    "timestamp": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "model": "Model B",
-                    "model_id": model_2_id,
-                    "prompt": question_data['question'],
-                    "expected_response": question_data['expected_response'],
-                    "actual_response": model_b_result.to_csv(index=False) if isinstance(question_data['parsed_response'], pd.DataFrame) else str(model_b_result.iloc[0, 0]),
-                    "result": "✅ PASS" if model_b_passed else "❌ FAIL"
-                })
-
-        # Complete the evaluation
-        progress_bar.progress(1.0)
-        st.session_state.evaluation_suite["running"] = False
-        st.success("🎉 Test Suite Complete! Check the results below.")
+    # Attach to a job still running in this process, e.g. after a page reload
+    if 'active_run_id' not in st.session_state and job_manager.live_jobs():
+        st.session_state['active_run_id'] = job_manager.live_jobs()[0].run_id
+        st.session_state['last_run_id'] = st.session_state['active_run_id']
+
+    if 'active_run_id' in st.session_state:
+        active_job = job_manager.get(st.session_state['active_run_id'])
+        if active_job is not None and active_job.kind == "replay":
+            st.info("A production prompt replay is running; see the Production Monitoring tab.")
+        else:
+            show_job_progress(st.session_state['active_run_id'])
+    else:
+        # Jobs interrupted by a restart, or that ended with failed queries, can pick up from
+        # their last checkpoint; only the tasks that didn't succeed are run again
+        interrupted = [run_id for run_id in store.unfinished_jobs()
+                       if job_manager.get(run_id) is None or not job_manager.get(run_id).running]
+        if interrupted:
+            st.markdown("### Unfinished Runs")
+            jobs = {run_id: store.get_job(run_id) for run_id in interrupted}
+            resume_run = st.selectbox("Run", interrupted, format_func=lambda run_id: (
+                f"{run_id} ({jobs[run_id]['completed']} of {jobs[run_id]['total']} done)"))
+            if st.button("Resume from checkpoint"):
+                job_manager.resume(resume_run, make_evaluator)
+                st.session_state['active_run_id'] = resume_run
+                st.session_state['last_run_id'] = resume_run
+                st.rerun()
+
+    finished = st.session_state.get('finished_run')
+    if finished and finished[3] == "suite":
+        run_id, status, error, _ = st.session_state.pop('finished_run')
+        if job_manager.get(run_id) is not None:
+            show_job_errors(job_manager.get(run_id))
+        if status == "done":
+            st.success("🎉 Test Suite Complete! Check the results below.")
+            counters = store.summary(kind="suite", run_id=run_id)
+            reused = int(counters["reused"].sum())
+            if reused:
+                st.info(f"{reused} results were reused from earlier runs and {int(counters['total'].sum()) - reused} were re-run.")
+            saved = int(counters["shared"].sum())
+            if saved:
+                st.info(f"{saved} query executions were saved by sharing identical queries across models and questions.")
+        elif status == "failed":
+            st.error(f"Test suite run {run_id} failed: {error}")
+        else:
+            st.warning(f"Test suite run {run_id} was {status}.")
 
 # Prompt Log Tab Content
 with prompt_log_tab:
+    st.markdown("### Replay Production Prompts")
+    st.markdown("""Sample unique prompts from a production prompt log and replay them against every model,
+    to see how often the models disagree. The log is a JSONL or CSV file (optionally gzipped) on this server;
+    it's streamed rather than loaded, so it can be several GB.""")
+    with st.form("replay_form"):
+        log_path = st.text_input("Prompt log file", placeholder="/var/log/omni/prompts.jsonl.gz")
+        field_col, stratum_col, size_col = st.columns(3)
+        prompt_field = field_col.text_input("Prompt field", value="prompt")
+        stratum_field = stratum_col.text_input("Stratify by field (optional)",
+                                               help="Sample each value of this field in proportion to its prompts")
+        sample_size = size_col.number_input("Sample size", min_value=1, max_value=10000, value=200)
+        replay_submitted = st.form_submit_button("Sample and Replay",
+                                                 disabled=len(models) < 2 or 'active_run_id' in st.session_state)
+    if len(models) < 2:
+        st.caption("Replays compare models with each other; add a second model in the sidebar.")
+    if replay_submitted and log_path.strip():
+        # The log is sampled by the job, so a large one doesn't block the page; the seed
+        # lets a resumed job draw the same sample
+        sample = {"path": log_path.strip(), "size": int(sample_size), "field": prompt_field.strip(),
+                  "stratum_field": stratum_field.strip() or None, "seed": random.randrange(2 ** 32)}
+        job = job_manager.start(evaluator, None, models, max_workers=st.session_state['max_in_flight'],
+                                kind="replay", sample=sample)
+        st.session_state['active_run_id'] = job.run_id
+        st.session_state['last_run_id'] = job.run_id
+        st.rerun()
+
+    if 'active_run_id' in st.session_state:
+        active_job = job_manager.get(st.session_state['active_run_id'])
+        if active_job is not None and active_job.kind == "replay":
+            show_job_progress(active_job.run_id)
+
+    finished = st.session_state.get('finished_run')
+    if finished and finished[3] == "replay":
+        run_id, status, error, _ = st.session_state.pop('finished_run')
+        job = job_manager.get(run_id)
+        if job is not None:
+            show_sample_stats(job)
+            show_job_errors(job)
+        if status == "done" and job is not None and not job.total:
+            st.warning("No prompts found in the log.")
+        elif status == "done":
+            st.success("Replay complete. Disagreement between each pair of models:")
+            st.dataframe(format_summary(store.summary(kind="replay", run_id=run_id), "replay",
+                                        ["model", "model_id"]).astype(str))
+        elif status == "failed":
+            st.error(f"Replay run {run_id} failed: {error}")
+        else:
+            st.warning(f"Replay run {run_id} was {status}.")
+
     st.markdown("""
     <iframe src="https://omni.embed-omniapp.co/dashboards/433bb1e0" width="100%" height="3200" frameborder="0"></iframe>
     """, unsafe_allow_html=True)
 
-# Show evaluation history
-if st.session_state.evaluations:
-    # Convert evaluations to DataFrame
-    df_evals = pd.DataFrame(st.session_state.evaluations)
-    
-    # Create summary based on evaluation type
-    if 'result' in df_evals.columns:  # Automatic comparison results
-        summary = df_evals.groupby('model').agg({
-            'result': [
-                ('Total Tests', 'count'),
-                ('Passed', lambda x: (x == '✅ PASS').sum()),
-                ('Failed', lambda x: (x == '❌ FAIL').sum()),
-                ('Pass Rate %', lambda x: (x == '✅ PASS').mean() * 100)
-            ]
-        })
-        summary.columns = summary.columns.get_level_values(1)
-        summary['Pass Rate %'] = summary['Pass Rate %'].apply(lambda x: f"{x:.1f}%")
-    else:  # Manual feedback
-        summary = df_evals.groupby('model').agg({
-            'feedback': [
-                ('Total Evaluations', 'count'),
-                ('👍 Count', lambda x: (x == '👍').sum()),
-                ('👎 Count', lambda x: (x == '👎').sum()),
-                ('Net Positive %', lambda x: (x == '👍').mean() * 100)
-            ]
-        })
-        summary.columns = summary.columns.get_level_values(1)
-        summary['Net Positive %'] = summary['Net Positive %'].apply(lambda x: f"{x:.1f}%")
-    
+def show_result_diff(blob_id, question, answer):
+    """Rows of a saved result that aren't in the expected answer, and expected rows it's missing."""
+    expected = parse_expected_answer(question, answer)
+    if not isinstance(expected, pa.Table):
+        st.info("The expected answer isn't a table, so there's nothing to diff.")
+        return
+    # The diff needs every row, not just the ones on display
+    result = result_blobs.load(blob_id)
+    diff = diff_results(result, expected) if result is not None else None
+    if result is None:
+        st.warning("This result is no longer available.")
+    elif diff is None:
+        st.warning("The result and the expected answer have different columns, so rows can't be matched.")
+    elif diff.empty:
+        st.success("The result matches the expected answer.")
+    else:
+        counts = diff["_diff"].value_counts()
+        st.write(f"{counts.get('unexpected', 0)} unexpected rows, {counts.get('missing', 0)} missing rows")
+        show_table(pa.Table.from_pandas(diff, preserve_index=False))
 
-    # Display detailed history
+# Show evaluation history
+@st.fragment
+def show_history():
+    """Filterable, paginated evaluation history and its summaries."""
     st.markdown("### Detailed History")
-    if 'result' in df_evals.columns:
-        # Convert DataFrame to string format to avoid Arrow serialization issues
-        history_df = df_evals.sort_values('timestamp', ascending=False).copy()
-        for col in history_df.columns:
-            if col == 'actual_response' and isinstance(history_df[col].iloc[0], dict):
-                # Convert dictionary to CSV string for actual_response
-                history_df[col] = history_df[col].apply(lambda x: pd.DataFrame(x).to_csv(index=False) if isinstance(x, dict) else str(x))
+
+    # Filters are pushed down to the store so only one page of records is ever loaded
+    kinds = ["suite", "feedback", "replay"]
+    first_kind = next((i for i, kind in enumerate(kinds) if store.count(kind=kind)), 0)
+    filter_cols = st.columns(4)
+    history_kind = filter_cols[0].selectbox("Type", kinds, index=first_kind,
+                                            format_func={"suite": "Test Suite", "feedback": "Manual Feedback",
+                                                         "replay": "Production Replay"}.get)
+    model_filter = filter_cols[1].selectbox("Model ID", ["All"] + store.model_ids(kind=history_kind))
+    runs = store.runs(kind=history_kind)["run_id"].tolist() if history_kind != "feedback" else []
+    run_filter = filter_cols[2].selectbox("Run", ["All"] + runs,
+                                          index=1 + runs.index(st.session_state['last_run_id'])
+                                          if st.session_state.get('last_run_id') in runs else 0)
+    prompt_filter = filter_cols[3].text_input("Prompt starts with")
+    filters = {
+        "kind": history_kind,
+        "model_id": None if model_filter == "All" else model_filter,
+        "run_id": None if run_filter == "All" else run_filter,
+        "prompt": prompt_filter or None
+    }
+
+    page_size = 50
+    total = store.count(**filters)
+    pages = max(1, -(-total // page_size))
+    page = st.number_input(f"Page (of {pages}, {total} records)", min_value=1, max_value=pages, value=1)
+    history_df = store.query(HISTORY_COLUMNS[history_kind], limit=page_size, offset=(page - 1) * page_size, **filters)
+    st.dataframe(history_df.astype(str), use_container_width=True)
+
+    # Table results are saved as Arrow blobs; load one on demand rather than inlining it
+    saved = history_df.dropna(subset=["actual_response_id"]) if "actual_response_id" in history_df else history_df.iloc[:0]
+    if not saved.empty:
+        with st.expander("View Saved Result"):
+            choice = st.selectbox("Record", saved.index, format_func=lambda i: (
+                f"{saved.at[i, 'timestamp']} · {saved.at[i, 'model']} · {saved.at[i, 'prompt']}"))
+            table = result_blobs.load(saved.at[choice, "actual_response_id"], limit=DISPLAY_ROWS)
+            if table is None:
+                st.warning("This result is no longer available.")
             else:
-                history_df[col] = history_df[col].astype(str)
-        
-        st.dataframe(history_df[['timestamp', 'model', 'prompt', 'expected_response', 'actual_response', 'result']])
-    else:
-        history_df = df_evals.sort_values('timestamp', ascending=False)[
-            ['timestamp', 'model', 'prompt', 'feedback', 'note']
-        ]
-        st.dataframe(history_df.astype(str))
+                show_table(table)
+                if "expected_response" in saved and st.button("Diff against expected answer"):
+                    show_result_diff(saved.at[choice, "actual_response_id"], saved.at[choice, "prompt"],
+                                     saved.at[choice, "expected_response"])
 
-    # Display summary
+    # Summaries come from the store's running counters rather than from the records
     st.markdown("### Evaluation Results")
-    st.dataframe(summary.astype(str))
-    
+    breakdown = st.radio("Breakdown", ["By model", "By question"], horizontal=True, label_visibility="collapsed")
+    if breakdown == "By model":
+        counters = store.summary(kind=history_kind, model_id=filters["model_id"], run_id=filters["run_id"])
+        st.dataframe(format_summary(counters, history_kind, ["model", "model_id"]).astype(str))
+
+        stats = percentiles(store.metric_histograms(kind=history_kind, run_id=filters["run_id"],
+                                                    model_id=filters["model_id"]))
+        if not stats.empty:
+            st.markdown("#### Latency and Payload Percentiles")
+            stats["unit"] = stats["metric"].map(lambda metric: METRICS.get(metric, (None, "", ""))[1])
+            stats = stats.set_index(["model", "metric"])[["unit", "count", "p50", "p95", "p99"]]
+            st.dataframe(stats.round(4).astype(str))
+        if prompt_filter:
+            st.caption("The summary covers all prompts; the prompt filter only applies to the history above.")
+    else:
+        question_page = st.number_input("Question page", min_value=1, value=1)
+        counters, question_total = store.question_summary(kind=history_kind, model_id=filters["model_id"],
+                                                          run_id=filters["run_id"], limit=page_size,
+                                                          offset=(question_page - 1) * page_size)
+        counters = counters.rename(columns={"scope_key": "prompt"})
+        if history_kind == "suite":
+            # Question x model pass-rate matrix; easier to scan than one row per pair with many models.
+            # Labels like "Model A" are only positions in a run, so columns are per model ID.
+            matrix = counters.assign(pass_rate=counters["passed"] / counters["total"] * 100,
+                                     column=counters["model"] + " (" + counters["model_id"] + ")").pivot_table(
+                index="prompt", columns="column", values="pass_rate").rename_axis(columns="model")
+            st.dataframe(matrix.map(lambda x: "" if pd.isna(x) else f"{x:.0f}%"))
+            with st.expander("Counters"):
+                st.dataframe(format_summary(counters, history_kind, ["prompt", "model", "model_id"]).astype(str))
+        else:
+            st.dataframe(format_summary(counters, history_kind, ["prompt", "model", "model_id"]).astype(str))
+        st.caption(f"{question_total} questions" + (f" in run {filters['run_id']}" if filters["run_id"] else ""))
+
+if store.count():
+    show_history()
 
 st.markdown("""
     <div style="text-align: center; color: #666; font-size: 0.8rem; font-style: italic;">
@@ -0,0 +1,210 @@
+"""Headless batch runner for Question/Answer test suites, for CI and nightly regressions.
+
+Example:
+    python batch_eval.py suite.csv --model <model id or URL> --model <model id or URL> \
+        --output results.jsonl --min-pass-rate 90
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from collections import Counter
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+from compiled_suite import SUITE_EXTENSION, open_suite
+from evaluation import PASS, extract_model_id_from_url, model_label
+from evaluation_store import COLUMNS, EvaluationStore
+from metrics import METRICS, write_metrics
+from sharded_runner import build_evaluator, run_sharded
+
+
+logger = logging.getLogger(__name__)
+
+# Flags Evaluator.evaluate sets on records, besides the store's columns and the metrics
+RECORD_FLAGS = ["shared_generation", "shared_execution", "reused"]
+
+
+def _record_field(name):
+    if name in RECORD_FLAGS:
+        return pa.field(name, pa.bool_())
+    if name == "retries" or METRICS.get(name, (None, None))[1] in ("bytes", "rows"):
+        return pa.field(name, pa.int64())
+    if name in METRICS:
+        return pa.field(name, pa.float64())
+    return pa.field(name, pa.string())
+
+
+# Parquet output always has every record field, typed up front, so records whose fields were
+# unset (e.g. reused or cached ones) at the start of a run don't decide the file's schema
+RECORD_SCHEMA = pa.schema([_record_field(name) for name in
+                           dict.fromkeys(COLUMNS + list(METRICS) + RECORD_FLAGS + ["reused_from_run"])])
+
+
+class RecordWriter:
+    """Streams evaluation records to a JSONL or Parquet file as they complete."""
+
+    def __init__(self, path, batch_size=100):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self.batch_size = batch_size
+        self._batch = []
+        self._writer = None
+        self._unknown = set()
+        self._file = None if self.parquet else open(path, "w", encoding="utf-8")
+
+    def write(self, record):
+        if not self.parquet:
+            self._file.write(json.dumps(record, default=str) + "\n")
+            self._file.flush()
+            return
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self._flush_batch()
+
+    def _flush_batch(self):
+        if not self._batch:
+            return
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, RECORD_SCHEMA)
+        unknown = {name for record in self._batch for name in record}.difference(RECORD_SCHEMA.names, self._unknown)
+        if unknown:
+            logger.warning(f"Record fields not in the Parquet schema are left out: {', '.join(sorted(unknown))}")
+            self._unknown |= unknown
+        self._writer.write_table(pa.Table.from_pylist(self._batch, schema=RECORD_SCHEMA))
+        self._batch = []
+
+    def close(self):
+        if self.parquet:
+            self._flush_batch()
+            if self._writer is not None:
+                self._writer.close()
+        else:
+            self._file.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a Question/Answer test suite against one or more Omni models.")
+    parser.add_argument("suite", help=f"CSV file with Question and Answer columns, or a compiled {SUITE_EXTENSION} file")
+    parser.add_argument("--model", action="append", required=True, dest="models",
+                        help="Model ID or Omni model URL; repeat for each model to evaluate")
+    parser.add_argument("--topic", default=os.getenv("OMNI_TOPIC", "orders_ai"), help="Topic name for queries")
+    parser.add_argument("--base-url", default=os.getenv("OMNI_BASE_URL"), help="Omni base URL (default: $OMNI_BASE_URL)")
+    parser.add_argument("--workers", type=int, default=8, help="Maximum number of queries in flight (per process)")
+    parser.add_argument("--fixed-concurrency", action="store_true",
+                        help="Always keep --workers queries in flight instead of adapting to Omni's backpressure")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Shard the suite across this many worker processes")
+    parser.add_argument("--output", help="Stream records to this .jsonl or .parquet file")
+    parser.add_argument("--store", help="Also append records to this evaluation store (e.g. the app's evaluations.db)")
+    parser.add_argument("--changed-only", action="store_true",
+                        help="Reuse results from --store for test cases and models that haven't changed; "
+                             "run only new or changed pairs")
+    parser.add_argument("--results-dir", help="Save table results as Arrow files here, referenced by actual_response_id")
+    parser.add_argument("--metrics", help="Export per-phase latency and payload metrics to this .prom or .json file")
+    parser.add_argument("--min-pass-rate", type=float, default=0.0,
+                        help="Exit non-zero if any model's pass rate (%%) is below this")
+    parser.add_argument("--read-timeout", type=float, default=120.0, help="Read timeout for generate-query calls (s)")
+    parser.add_argument("--max-retries", type=int, default=3, help="Retries for 429 and 5xx responses")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the query and result cache")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    load_dotenv()
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+
+    api_key = os.getenv("OMNI_API_KEY")
+    if not api_key or not args.base_url:
+        print("OMNI_API_KEY and OMNI_BASE_URL (or --base-url) must be set", file=sys.stderr)
+        return 2
+
+    if args.changed_only and not args.store:
+        print("--changed-only needs --store to look up earlier results", file=sys.stderr)
+        return 2
+
+    models = []
+    for i, model in enumerate(args.models):
+        model_id = extract_model_id_from_url(model) if "/models/" in model else model
+        if not model_id:
+            print(f"Invalid model ID or URL: {model}", file=sys.stderr)
+            return 2
+        models.append((model_label(i), model_id))
+
+    # The suite is streamed, so its size is bounded by disk rather than memory
+    try:
+        questions = open_suite(args.suite)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    evaluator = build_evaluator({"base_url": args.base_url, "api_key": api_key, "topic_name": args.topic,
+                                 "pool_size": args.workers, "read_timeout": args.read_timeout,
+                                 "max_retries": args.max_retries, "cache_dir": ".cache/results",
+                                 "bypass_cache": args.no_cache, "results_dir": args.results_dir,
+                                 "adaptive": not args.fixed_concurrency})
+
+    writer = RecordWriter(args.output) if args.output else None
+    # Metrics are aggregated by the store, so use a throwaway one if none was given
+    store = EvaluationStore(args.store or ":memory:") if args.store or args.metrics else None
+    run_id = store.start_run("suite", models) if store else None
+
+    passed, shared, reused = Counter(), Counter(), Counter()
+
+    def on_record(record):
+        if record["result"] == PASS:
+            passed[record["model"]] += 1
+        if record.get("shared_execution"):
+            shared[record["model"]] += 1
+        if record.get("reused"):
+            reused[record["model"]] += 1
+        if writer:
+            writer.write(record)
+        if store:
+            store.append(record, run_id)
+
+    reuse = store.reusable_record if args.changed_only else None
+    try:
+        if args.processes > 1:
+            run_sharded(evaluator, questions, models, processes=args.processes, max_workers=args.workers,
+                        on_record=on_record, reuse=reuse)
+        else:
+            evaluator.run_suite(questions, models, max_workers=args.workers, on_record=on_record, keep_records=False,
+                                reuse=reuse)
+    finally:
+        if writer:
+            writer.close()
+
+    if args.metrics:
+        write_metrics(store, args.metrics, run_id=run_id)
+
+    # Failed queries have no record, so they count against the pass rate
+    failing = []
+    print(f"{'Model':<10} {'Model ID':<40} {'Passed':>8} {'Total':>6} {'Pass Rate':>10} {'Shared':>7} "
+          f"{'Reused':>7} {'Re-run':>7}")
+    total = len(questions)
+    for label, model_id in models:
+        pass_rate = passed[label] / total * 100 if total else 0.0
+        print(f"{label:<10} {model_id:<40} {passed[label]:>8} {total:>6} {pass_rate:>9.1f}% {shared[label]:>7} "
+              f"{reused[label]:>7} {total - reused[label]:>7}")
+        if pass_rate < args.min_pass_rate:
+            failing.append(label)
+    print(f"Query executions saved by sharing identical queries: {sum(shared.values())}")
+    # Sharded runs adapt their limits inside each worker process, so there's nothing to show here
+    if evaluator.limits is not None:
+        for limit in evaluator.limits.snapshot():
+            print(f"Concurrency {limit['endpoint']:<8} {limit['model_id']:<40} limit {limit['limit']:>3}  "
+                  f"throttled {limit['throttled']:>4}  errors {limit['error']:>4}  slow {limit['slow']:>4}")
+
+    if failing:
+        print(f"Pass rate below {args.min_pass_rate:.1f}% for: {', '.join(failing)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
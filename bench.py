@@ -0,0 +1,132 @@
+"""Benchmarks for the evaluation pipeline, run entirely against the local mock server.
+
+    python bench.py --output bench_results.json
+
+Measures end-to-end suite throughput, parse_expected_response on large CSV and JSON
+answers, and compare_results at 1k, 100k and 1M rows. Results are written as JSON so
+they can be diffed between commits.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from omni_python_sdk import OmniAPI
+
+from evaluation import Evaluator, compare_results, parse_expected_response
+from mock_server import MockConfig, MockOmniServer, result_table
+from omni_http import OmniHTTPClient
+
+
+def timed(func, repeat=3):
+    """Best-of-repeat wall time of func() in seconds, and its last return value."""
+    best, value = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def bench_suite_throughput(questions=200, models=2, workers=16, latency=0.05, rows=100):
+    """Queries per second for a full suite against the mock server, with the cache disabled."""
+    config = MockConfig(generate_latency=latency, run_latency=latency, rows=rows)
+    server = MockOmniServer(config).start()
+    try:
+        # Expected answers match the mock's results, so every test should pass
+        suite = []
+        for i in range(questions):
+            prompt = f"benchmark question {i}"
+            expected = result_table({"query": {"prompt": prompt, "limit": rows}}).to_pandas()
+            suite.append({"question": prompt, "expected_response": "", "parsed_response": expected})
+        model_list = [(f"Model {chr(ord('A') + m)}", f"model-{m}") for m in range(models)]
+
+        evaluator = Evaluator(OmniHTTPClient(server.url, "bench", pool_size=workers),
+                              OmniAPI("bench", base_url=server.url), "orders_ai")
+        start = time.perf_counter()
+        records = evaluator.run_suite(suite, model_list, max_workers=workers)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    tasks = questions * models
+    return {"questions": questions, "models": models, "workers": workers, "latency_s": latency,
+            "rows": rows, "elapsed_s": round(elapsed, 4), "queries_per_s": round(tasks / elapsed, 2),
+            "passed": sum(r["result"].endswith("PASS") for r in records), "tasks": tasks}
+
+
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "order_id": np.arange(rows),
+        "status": rng.choice(["complete", "pending", "returned"], rows),
+        "revenue": np.round(rng.uniform(1, 1000, rows), 2),
+        "created_at": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24, rows), unit="h"),
+    })
+
+
+def bench_parse(rows):
+    """parse_expected_response on a CSV answer and a JSON answer of the given size."""
+    df = make_frame(rows)
+    csv_answer = df.to_csv(index=False)
+    json_answer = df.astype({"created_at": str}).to_json(orient="records")
+    csv_s, _ = timed(lambda: parse_expected_response(csv_answer))
+    json_s, _ = timed(lambda: parse_expected_response(json_answer))
+    return {"rows": rows, "csv_bytes": len(csv_answer), "csv_s": round(csv_s, 4),
+            "json_bytes": len(json_answer), "json_s": round(json_s, 4)}
+
+
+def bench_compare(rows, repeat=3):
+    """compare_results for equal results in different row orders, and for a one-value mismatch.
+
+    Query results arrive as Arrow tables and expected answers as parsed DataFrames, as in a suite run.
+    """
+    expected = make_frame(rows)
+    shuffled = expected.sample(frac=1, random_state=1).reset_index(drop=True)
+    result = pa.Table.from_pandas(shuffled, preserve_index=False)
+    changed = shuffled.copy()
+    changed.loc[rows // 2, "revenue"] += 1
+    mismatch = pa.Table.from_pandas(changed, preserve_index=False)
+    equal_s, equal = timed(lambda: compare_results(result, expected), repeat)
+    mismatch_s, different = timed(lambda: compare_results(mismatch, expected), repeat)
+    assert equal and not different, "compare_results returned the wrong answer"
+    return {"rows": rows, "equal_s": round(equal_s, 4), "mismatch_s": round(mismatch_s, 4)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the evaluation pipeline against the mock Omni server.")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--quick", action="store_true", help="Skip the largest sizes")
+    args = parser.parse_args(argv)
+
+    compare_sizes = [1_000, 100_000] if args.quick else [1_000, 100_000, 1_000_000]
+    parse_sizes = [1_000, 10_000] if args.quick else [1_000, 100_000]
+
+    results = {"timestamp": pd.Timestamp.now().isoformat(), "python": sys.version.split()[0],
+               "platform": platform.platform(), "pandas": pd.__version__, "benchmarks": {}}
+    benchmarks = results["benchmarks"]
+
+    benchmarks["suite_throughput"] = bench_suite_throughput(questions=50 if args.quick else 200)
+    print(f"suite throughput: {benchmarks['suite_throughput']['queries_per_s']} queries/s")
+
+    benchmarks["parse_expected_response"] = []
+    for rows in parse_sizes:
+        benchmarks["parse_expected_response"].append(bench_parse(rows))
+        print(f"parse_expected_response {rows} rows: {benchmarks['parse_expected_response'][-1]}")
+
+    benchmarks["compare_results"] = []
+    for rows in compare_sizes:
+        benchmarks["compare_results"].append(bench_compare(rows, repeat=1 if rows >= 1_000_000 else 3))
+        print(f"compare_results {rows} rows: {benchmarks['compare_results'][-1]}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
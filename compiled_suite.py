@@ -0,0 +1,209 @@
+"""Test suite files: Question/Answer CSVs streamed in chunks, and compiled suites.
+
+    python compiled_suite.py suite.csv suite.suite
+
+A compiled suite is an Arrow IPC file with one row per test case. Table answers are kept
+as nested Arrow IPC streams next to their column set, kinds, row count and row-hash sum,
+so loading is a memory map rather than a re-parse of every answer. CSV suites are read a
+chunk at a time and their answers are parsed only when a case runs.
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from evaluation import compile_case
+
+SUITE_EXTENSION = ".suite"
+SUITE_FORMAT = b"blobby-eval-suite"
+SUITE_VERSION = b"2"
+# Version 1 row hashes included numeric columns, which are now compared with a tolerance;
+# those suites still load, but their fingerprints aren't used
+OLD_SUITE_VERSIONS = {b"1"}
+
+SUITE_SCHEMA = pa.schema([
+    ("question", pa.large_string()),
+    ("expected_response", pa.large_string()),
+    ("answer", pa.large_binary()),          # Expected table as an Arrow IPC stream; null for single values
+    ("columns", pa.list_(pa.string())),
+    ("kinds", pa.list_(pa.string())),
+    ("num_rows", pa.int64()),
+    ("row_hash", pa.uint64()),
+], metadata={b"format": SUITE_FORMAT, b"version": SUITE_VERSION})
+
+
+def _serialize_table(table):
+    sink = pa.BufferOutputStream()
+    with ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _case_row(case):
+    fingerprint = case.get("fingerprint")
+    is_table = isinstance(case["parsed_response"], pa.Table)
+    return {
+        "question": str(case["question"]),
+        "expected_response": case["expected_response"],
+        "answer": _serialize_table(case["parsed_response"]) if is_table else None,
+        "columns": fingerprint["columns"] if fingerprint else None,
+        "kinds": fingerprint["kinds"] if fingerprint else None,
+        "num_rows": fingerprint["num_rows"] if fingerprint else None,
+        "row_hash": fingerprint["row_hash"] if fingerprint else None,
+    }
+
+
+def compile_suite(pairs, path, batch_size=1000):
+    """Compile (question, answer) pairs into a suite file; returns the number of test cases.
+
+    Unparseable answers are skipped, as when loading a CSV in the app.
+    """
+    tmp_path = f"{path}.tmp"
+    count, batch = 0, []
+    with pa.OSFile(tmp_path, "wb") as sink, ipc.new_file(sink, SUITE_SCHEMA) as writer:
+        for question, answer in pairs:
+            case = compile_case(question, answer)
+            if case is None:
+                continue
+            batch.append(_case_row(case))
+            if len(batch) >= batch_size:
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=SUITE_SCHEMA))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=SUITE_SCHEMA))
+            count += len(batch)
+    os.replace(tmp_path, path)
+    return count
+
+
+class CsvSuite:
+    """A Question/Answer CSV read in chunks; cases come out unparsed, for the evaluator to parse lazily."""
+
+    def __init__(self, path, chunksize=1000):
+        self.path = path
+        self.chunksize = chunksize
+        self._length = None
+        header = pd.read_csv(path, nrows=0).columns
+        if "Question" not in header or "Answer" not in header:
+            raise ValueError("CSV must contain 'Question' and 'Answer' columns")
+
+    def _chunks(self, **kwargs):
+        return pd.read_csv(self.path, usecols=["Question", "Answer"], dtype=str,
+                           chunksize=self.chunksize, **kwargs)
+
+    def __len__(self):
+        if self._length is None:
+            self._length = sum(len(chunk) for chunk in self._chunks())
+        return self._length
+
+    def __iter__(self):
+        for chunk in self._chunks():
+            for question, answer in zip(chunk["Question"], chunk["Answer"]):
+                yield {"question": question, "expected_response": answer}
+
+    def page(self, offset, limit):
+        """Cases offset to offset + limit, reading only as far into the file as needed."""
+        cases, start = [], 0
+        # Answers span several lines, so rows can't be skipped by line number
+        for chunk in self._chunks():
+            if start + len(chunk) > offset:
+                chunk = chunk.iloc[max(0, offset - start):max(0, offset - start) + limit - len(cases)]
+                cases += [{"question": question, "expected_response": answer}
+                          for question, answer in zip(chunk["Question"], chunk["Answer"])]
+                if len(cases) >= limit:
+                    break
+            start += self.chunksize
+        return cases
+
+
+class CompiledSuite:
+    """A compiled suite opened from a path (memory-mapped) or from bytes.
+
+    Iterating yields test cases in the same shape as build_test_cases; expected tables
+    are decoded from the mapped file without copying.
+    """
+
+    def __init__(self, source):
+        self.path = source if isinstance(source, str) else None
+        if isinstance(source, (bytes, bytearray)):
+            source = pa.BufferReader(source)
+        elif isinstance(source, str):
+            source = pa.memory_map(source)
+        self._reader = ipc.open_file(source)
+        metadata = self._reader.schema.metadata or {}
+        if metadata.get(b"format") != SUITE_FORMAT:
+            raise ValueError("Not a compiled suite file")
+        if metadata.get(b"version") != SUITE_VERSION and metadata.get(b"version") not in OLD_SUITE_VERSIONS:
+            raise ValueError(f"Unsupported compiled suite version {metadata.get(b'version')!r}")
+        self._fingerprints = metadata.get(b"version") == SUITE_VERSION
+        self._length = sum(self._reader.get_batch(i).num_rows for i in range(self._reader.num_record_batches))
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for i in range(self._reader.num_record_batches):
+            yield from self._cases(self._reader.get_batch(i))
+
+    def page(self, offset, limit):
+        """Cases offset to offset + limit, decoding only the batches they fall in."""
+        cases, start = [], 0
+        for i in range(self._reader.num_record_batches):
+            batch = self._reader.get_batch(i)
+            if start + batch.num_rows > offset and len(cases) < limit:
+                skip = max(0, offset - start)
+                cases += list(self._cases(batch.slice(skip, limit - len(cases))))
+            start += batch.num_rows
+        return cases
+
+    def _cases(self, batch):
+        answers = batch.column("answer")
+        fields = {name: batch.column(name).to_pylist() for name in SUITE_SCHEMA.names if name != "answer"}
+        for j in range(batch.num_rows):
+            answer = fields["expected_response"][j]
+            case = {"question": fields["question"][j], "expected_response": answer}
+            if answers[j].is_valid:
+                case["parsed_response"] = ipc.open_stream(answers[j].as_buffer()).read_all()
+                if case["parsed_response"].num_rows == 0 and not answer.lstrip().startswith(("[", "{")):
+                    # Older suites stored single values as header-only CSV tables
+                    case["parsed_response"] = answer
+                elif self._fingerprints:
+                    case["fingerprint"] = {name: fields[name][j] for name in ("columns", "kinds", "num_rows", "row_hash")}
+            else:
+                case["parsed_response"] = fields["expected_response"][j]
+            yield case
+
+
+def load_suite(path):
+    """Open a compiled suite file."""
+    return CompiledSuite(path)
+
+
+def open_suite(path):
+    """Open a suite file for streaming: a compiled suite, or else a Question/Answer CSV."""
+    return load_suite(path) if path.endswith(SUITE_EXTENSION) else CsvSuite(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile a Question/Answer CSV into a suite file.")
+    parser.add_argument("csv", help="CSV file with Question and Answer columns")
+    parser.add_argument("output", nargs="?", help=f"Suite file to write (default: the CSV name with {SUITE_EXTENSION})")
+    args = parser.parse_args(argv)
+
+    try:
+        suite = CsvSuite(args.csv)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    output = args.output or os.path.splitext(args.csv)[0] + SUITE_EXTENSION
+    count = compile_suite(((case["question"], case["expected_response"]) for case in suite), output)
+    print(f"Compiled {count} of {len(suite)} test cases to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""Adaptive concurrency limits for Omni API calls, driven by the backpressure each call sees.
+
+Each endpoint, and each model on that endpoint, gets its own AIMD limit: it grows by about
+one slot per limit's worth of healthy calls, and is cut by a quarter on a 429, a server
+error or timeout, or a sustained rise in latency. Latency is judged per window of calls,
+comparing the window's median with a long-run smoothed baseline, since single prompts
+vary too much in latency to say anything about load on their own. A call needs a slot
+under both its model's limit and its endpoint's, since models share the endpoint's
+capacity. The thread pool's size stays the ceiling.
+"""
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit for one endpoint and model."""
+
+    def __init__(self, initial=4, min_limit=1, max_limit=64, backoff=0.75, latency_tolerance=2.0,
+                 hold_tolerance=1.5, min_slowdown=0.05, window=20, smoothing=0.1, cooldown=1.0):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.backoff = backoff
+        # A window whose median latency is above this multiple of the baseline counts as congestion...
+        self.latency_tolerance = latency_tolerance
+        # ...and above this multiple the limit stops growing until a window looks healthy again
+        self.hold_tolerance = hold_tolerance
+        # Rises smaller than this many seconds are ignored, so jitter on very fast calls isn't mistaken for congestion
+        self.min_slowdown = min_slowdown
+        # Calls per latency window, and how far each healthy window's median moves the baseline
+        self.window = window
+        self.smoothing = smoothing
+        self._latencies = []
+        self._holding = False
+        # Decrease at most once per cooldown, so one burst of failures only cuts the limit once
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.baseline = None
+        self.counts = {"ok": 0, "throttled": 0, "error": 0, "slow": 0}
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, outcome="ok", latency=None):
+        """Free a slot and adjust the limit; returns the reason if the limit was cut, else None.
+
+        outcome is "ok", "throttled" (429s or retried responses) or "error" (5xx, timeouts).
+        """
+        with self._cond:
+            self.in_flight -= 1
+            backoff = self.backoff
+            if outcome == "ok" and latency is not None:
+                slowdown = self._window_slowdown(latency)
+                if slowdown is not None:
+                    self._holding = slowdown > self.hold_tolerance
+                    if slowdown > self.latency_tolerance:
+                        # Cut harder the further latency is over the tolerance, but at most by half
+                        outcome, backoff = "slow", max(0.5, min(self.backoff, self.latency_tolerance / slowdown))
+            self.counts[outcome] += 1
+
+            reason = None
+            if outcome == "ok":
+                if not self._holding:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            elif time.monotonic() - self._last_decrease >= self.cooldown:
+                self.limit = max(self.min_limit, self.limit * backoff)
+                self._last_decrease = time.monotonic()
+                reason = outcome
+            self._cond.notify_all()
+            return reason
+
+    def _window_slowdown(self, latency):
+        """Add a healthy call's latency; when it ends a window, returns its median over the baseline, else None."""
+        self._latencies.append(latency)
+        if len(self._latencies) < self.window:
+            return None
+        median = statistics.median(self._latencies)
+        self._latencies = []
+        if self.baseline is None:
+            self.baseline = median
+            return 1.0
+        slowdown = median / self.baseline if median - self.baseline >= self.min_slowdown else 1.0
+        # The baseline falls quickly but only healthy windows raise it, and slowly, so congestion
+        # that builds up as the limit grows isn't accepted as normal. At the minimum limit our own
+        # load can't be the cause, so there the server has simply become slower.
+        if self.limit <= self.min_limit:
+            self.baseline = median
+        elif median < self.baseline:
+            self.baseline += self.smoothing * (median - self.baseline)
+        elif slowdown <= self.hold_tolerance:
+            self.baseline += self.smoothing / 10 * (median - self.baseline)
+        return slowdown
+
+    def set_max(self, max_limit):
+        with self._cond:
+            self.max_limit = max_limit
+            self.limit = max(self.min_limit, min(self.limit, max_limit))
+            self._cond.notify_all()
+
+
+# Model ID under which each endpoint's overall limit is kept
+ALL_MODELS = "*"
+
+
+class ConcurrencyController:
+    """Adaptive limits per endpoint and per (endpoint, model ID), plus a log of the times they were cut."""
+
+    def __init__(self, max_limit=8, initial=4, max_events=200, **options):
+        self.max_limit = max_limit
+        self.initial = initial
+        self.options = options
+        self.events = deque(maxlen=max_events)
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def set_max(self, max_limit):
+        """Change the ceiling for every limit, e.g. when the thread pool is resized."""
+        with self._lock:
+            self.max_limit = max_limit
+            limits = list(self._limits.values())
+        for limit in limits:
+            limit.set_max(max_limit)
+
+    def _limit(self, endpoint, model_id):
+        with self._lock:
+            key = (endpoint, model_id)
+            if key not in self._limits:
+                self._limits[key] = AdaptiveLimit(min(self.initial, self.max_limit), max_limit=self.max_limit,
+                                                  **self.options)
+            return self._limits[key]
+
+    @contextmanager
+    def slot(self, endpoint, model_id):
+        """Hold a slot for one call; set "outcome" and "latency" on the yielded dict to report how it went.
+
+        Calls that raise count as errors.
+        """
+        # Always model first, then endpoint, so waiting calls can't deadlock
+        limits = [(model_id, self._limit(endpoint, model_id)), (ALL_MODELS, self._limit(endpoint, ALL_MODELS))]
+        for _, limit in limits:
+            limit.acquire()
+        call = {"outcome": "ok", "latency": None}
+        try:
+            yield call
+        except BaseException:
+            call["outcome"] = "error"
+            raise
+        finally:
+            for key, limit in reversed(limits):
+                reason = limit.release(call["outcome"], call["latency"])
+                if reason:
+                    self.events.append({"time": time.strftime("%H:%M:%S"), "endpoint": endpoint, "model_id": key,
+                                        "reason": reason, "limit": int(limit.limit)})
+
+    def snapshot(self):
+        """Current limit, calls in flight and outcome counts for every endpoint and model seen.
+
+        Each endpoint's overall limit is listed under the model ID "*".
+        """
+        with self._lock:
+            items = list(self._limits.items())
+        return [{"endpoint": endpoint, "model_id": model_id, "limit": int(limit.limit), "in_flight": limit.in_flight,
+                 "baseline_latency_s": round(limit.baseline, 3) if limit.baseline is not None else None,
+                 **limit.counts}
+                for (endpoint, model_id), limit in sorted(items)]
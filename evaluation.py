@@ -0,0 +1,751 @@
+"""Streamlit-free evaluation core shared by the app and the batch runner."""
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from query_cache import query_hash
+
+logger = logging.getLogger(__name__)
+
+PASS = "✅ PASS"
+FAIL = "❌ FAIL"
+
+def extract_model_id_from_url(url):
+    """Extract model ID from Omni URL."""
+    try:
+        # Split by /models/ and take the second part
+        model_part = url.split('/models/')[1]
+        # Take everything before the next slash or end of string
+        model_id = model_part.split('/')[0]
+        return model_id
+    except:
+        return None
+
+def parse_expected_response(response_str):
+    """Parse expected response string into either a single value or dataframe."""
+    try:
+        # First try to parse as JSON
+        try:
+            data = json.loads(response_str)
+            if isinstance(data, dict):
+                # Create DataFrame preserving original column names
+                df = pd.DataFrame(data)
+                return df
+            elif isinstance(data, list):
+                # Create DataFrame from list of dicts preserving original column names
+                df = pd.DataFrame(data)
+                return df
+        except json.JSONDecodeError:
+            pass
+        
+        # Try to parse as CSV
+        try:
+            # StringIO to simulate file for read_csv
+            df = pd.read_csv(StringIO(response_str))
+            # A single value parses as a header with no rows, so it's only a table if there's data
+            if len(df):
+                return df
+        except:
+            pass
+        
+        # If not JSON or CSV, treat as single value
+        return response_str
+    except Exception as e:
+        logger.error(f"Error parsing expected response: {str(e)}")
+        return None
+
+# Numbers are equal when they differ by at most NUMERIC_ABS_TOLERANCE or NUMERIC_REL_TOLERANCE
+# of the expected value, so float noise such as 0.30000000000000004 vs 0.3 doesn't fail a test
+NUMERIC_ABS_TOLERANCE = 1e-6
+NUMERIC_REL_TOLERANCE = 1e-9
+# Decimal places numbers are rounded to when ordering rows for a comparison and matching rows for a diff
+DIFF_DECIMALS = 6
+
+def as_arrow(data):
+    """Arrow table for a DataFrame or table, with string column names."""
+    if isinstance(data, pd.DataFrame):
+        try:
+            data = pa.Table.from_pandas(data, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed-type object columns (e.g. ints and strings) are compared as text
+            text = {col: data[col].map(lambda v: None if pd.isna(v) else str(v))
+                    for col in data.columns if data[col].dtype == object}
+            data = pa.Table.from_pandas(data.assign(**text), preserve_index=False)
+    return data.rename_columns([str(name) for name in data.column_names])
+
+def _cast(column, target):
+    """Cast a column, or None if its values can't be represented as target."""
+    try:
+        return pc.cast(column, target)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        return None
+
+def _as_numeric(col):
+    """Column as float64 with NaN turned into null, or None if it isn't numeric."""
+    numeric = _cast(col, pa.float64()) if not pa.types.is_temporal(col.type) else None
+    if numeric is None:
+        return None
+    # NaN and null both mean "no value"; adding 0.0 turns -0.0 into 0.0
+    return pc.add(pc.if_else(pc.is_nan(numeric), None, numeric), 0.0)
+
+def _columns_equal(actual, expected):
+    """Element-wise equality of two normalized columns, within tolerance for numbers; nulls match nulls."""
+    if not pa.types.is_floating(actual.type):
+        return actual.equals(expected)
+    tolerance = pc.add(pc.multiply(pc.abs(expected), NUMERIC_REL_TOLERANCE), NUMERIC_ABS_TOLERANCE)
+    # Exact equality as well, so infinities match
+    close = pc.or_(pc.equal(actual, expected), pc.less_equal(pc.abs(pc.subtract(actual, expected)), tolerance))
+    both_null = pc.and_(pc.is_null(actual), pc.is_null(expected))
+    return pc.all(pc.or_(pc.fill_null(close, False), both_null)).as_py() is not False
+
+def _sort_rows(table):
+    """Rows of a normalized table in a canonical order.
+
+    Exact columns are sorted on first, then float columns only on their values rounded to
+    DIFF_DECIMALS, so rows that differ by float noise still line up with each other.
+    """
+    exact = [name for name in table.column_names if not pa.types.is_floating(table.column(name).type)]
+    floats = [name for name in table.column_names if name not in exact]
+    keys = [table.column(name) for name in exact] + [pc.round(table.column(name), DIFF_DECIMALS) for name in floats]
+    keys = pa.table(keys, names=[str(i) for i in range(len(keys))])
+    return table.take(pc.sort_indices(keys, sort_keys=[(name, "ascending") for name in keys.column_names]))
+
+def _normalize_column_pair(result_col, expected_col):
+    """Coerce a result column and an expected column to a common comparable type.
+
+    Returns the normalized pair, or None when the columns can't hold equal values
+    (e.g. numbers on one side and free text on the other).
+    """
+    # Dates only need parsing when at least one side is already a date/time column
+    if pa.types.is_temporal(result_col.type) or pa.types.is_temporal(expected_col.type):
+        pair = _cast(result_col, pa.timestamp("us")), _cast(expected_col, pa.timestamp("us"))
+        if pair[0] is not None and pair[1] is not None:
+            return pair
+
+    result_num, expected_num = _as_numeric(result_col), _as_numeric(expected_col)
+    if result_num is not None and expected_num is not None:
+        return result_num, expected_num
+    if (result_num is None) != (expected_num is None):
+        return None
+
+    return _cast(result_col, pa.large_string()), _cast(expected_col, pa.large_string())
+
+def _normalize_tables(result, expected):
+    """Normalize both tables column by column; None if column sets or types are incompatible."""
+    if set(result.column_names) != set(expected.column_names):
+        return None
+
+    names = sorted(result.column_names)
+    result_norm, expected_norm = {}, {}
+    for name in names:
+        pair = _normalize_column_pair(result.column(name), expected.column(name))
+        if pair is None or pair[0] is None or pair[1] is None:
+            return None
+        result_norm[name], expected_norm[name] = pair
+    return pa.table(result_norm), pa.table(expected_norm)
+
+def _column_kind(column):
+    """How a column is canonicalized for fingerprints: temporal, numeric or string."""
+    if pa.types.is_temporal(column.type):
+        return "temporal"
+    if _as_numeric(column) is not None:
+        return "numeric"
+    # ISO date strings hash as dates, so they still match a typed date column
+    if _cast(column, pa.timestamp("us")) is not None:
+        return "temporal"
+    return "string"
+
+def _canonical_column(column, kind):
+    if kind == "temporal":
+        return _cast(column, pa.timestamp("us"))
+    if kind == "numeric":
+        return _as_numeric(column)
+    return _cast(column, pa.large_string())
+
+def table_fingerprint(table, kinds=None):
+    """Order-independent fingerprint of a table: column set, row count and a row-hash sum.
+
+    The row hash covers the string and temporal columns only, since numeric columns are
+    compared with a tolerance.
+
+    Columns are canonicalized by kind (pass the expected answer's kinds when fingerprinting
+    a result, so both sides are hashed the same way). Returns None if a column can't be
+    converted to its kind.
+    """
+    names = sorted(table.column_names)
+    if kinds is None:
+        kinds = [_column_kind(table.column(name)) for name in names]
+    hashes = np.zeros(table.num_rows, dtype=np.uint64)
+    for name, kind in zip(names, kinds):
+        column = _canonical_column(table.column(name), kind)
+        if column is None:
+            return None
+        # Numbers equal within tolerance can hash differently, so only exact columns are hashed
+        if kind != "numeric":
+            hashes = hashes * np.uint64(1000003) ^ pd.util.hash_array(column.to_numpy())
+    # Summing (mod 2**64) makes the hash independent of row order while still counting duplicates
+    return {"columns": names, "kinds": kinds, "num_rows": table.num_rows,
+            "row_hash": int(hashes.sum(dtype=np.uint64))}
+
+def _fingerprint_mismatch(result, fingerprint):
+    """True if a result certainly differs from the answer a fingerprint was taken from."""
+    if result.num_rows != fingerprint["num_rows"] or sorted(result.column_names) != fingerprint["columns"]:
+        return True
+    actual = table_fingerprint(result, fingerprint["kinds"])
+    # A result that can't take the expected kinds is left to the full comparison
+    return actual is not None and actual["row_hash"] != fingerprint["row_hash"]
+
+def _values_equal(actual, expected):
+    """Compare two scalars, treating numerically equal values like 1.0 and "1" as equal."""
+    try:
+        return math.isclose(float(actual), float(expected), rel_tol=NUMERIC_REL_TOLERANCE,
+                            abs_tol=NUMERIC_ABS_TOLERANCE)
+    except (TypeError, ValueError):
+        return str(actual).strip() == str(expected).strip()
+
+def compare_results(result, expected_response, fingerprint=None):
+    """Compare query results (Arrow table or DataFrame) with expected response.
+
+    If the expected answer's fingerprint is given, most mismatches are rejected from it
+    without reading the expected rows; matches are still confirmed row by row.
+    """
+    try:
+        result = as_arrow(result)
+        # If expected response is a dataframe
+        if isinstance(expected_response, (pd.DataFrame, pa.Table)):
+            if fingerprint is not None and _fingerprint_mismatch(result, fingerprint):
+                return False
+            expected = as_arrow(expected_response)
+            # Cheap checks first: row count, column set, then column types
+            if result.num_rows != expected.num_rows:
+                return False
+
+            normalized = _normalize_tables(result, expected)
+            if normalized is None:
+                return False
+
+            # Order-independent comparison: sort both the same way (duplicates count),
+            # then compare column by column, numbers within tolerance
+            actual, wanted = _sort_rows(normalized[0]), _sort_rows(normalized[1])
+            return all(_columns_equal(actual.column(name), wanted.column(name)) for name in actual.column_names)
+
+        # If result is a single value
+        elif result.shape == (1, 1):
+            return _values_equal(result.column(0)[0].as_py(), expected_response)
+        else:
+            logger.warning("Result is a dataframe but expected response is not. Cannot compare directly.")
+            return False
+    except Exception as e:
+        logger.error(f"Comparison error: {str(e)}")
+        return False
+
+def diff_results(result, expected_response):
+    """Row-level diff between a result and an expected table.
+
+    Returns the rows found only in the result ("unexpected") and only in the expected
+    answer ("missing") as a DataFrame with a _diff column, or None if the two can't be
+    compared. Much more expensive than compare_results, so it's only built on request.
+    """
+    result, expected = as_arrow(result), as_arrow(expected_response)
+    normalized = _normalize_tables(result, expected)
+    if normalized is None:
+        return None
+
+    def occurrence_keys(table):
+        # Rows are matched on numbers rounded to DIFF_DECIMALS, and repeated rows are
+        # numbered so duplicates are matched one-for-one
+        df = table.to_pandas()
+        df = df.assign(**{name: df[name].round(DIFF_DECIMALS) for name in df.columns
+                          if pa.types.is_floating(table.schema.field(name).type)})
+        hashes = pd.util.hash_pandas_object(df, index=False)
+        return hashes.astype(str) + ":" + hashes.groupby(hashes).cumcount().astype(str)
+
+    result_keys, expected_keys = occurrence_keys(normalized[0]), occurrence_keys(normalized[1])
+    unexpected = np.flatnonzero(~result_keys.isin(expected_keys).to_numpy())
+    missing = np.flatnonzero(~expected_keys.isin(result_keys).to_numpy())
+    return pd.concat([result.take(unexpected).to_pandas().assign(_diff="unexpected"),
+                      expected.take(missing).to_pandas().assign(_diff="missing")], ignore_index=True)
+
+def compile_case(question, answer):
+    """Parse an expected answer once into a test case, or None if it can't be parsed.
+
+    Table answers are kept as Arrow tables along with their fingerprint.
+    """
+    parsed_response = parse_expected_response(answer)
+    if parsed_response is None:
+        return None
+    case = {"question": question, "expected_response": answer, "parsed_response": parsed_response}
+    if isinstance(parsed_response, pd.DataFrame):
+        case["parsed_response"] = as_arrow(parsed_response)
+        case["fingerprint"] = table_fingerprint(case["parsed_response"])
+    return case
+
+def build_test_cases(df):
+    """Turn a Question/Answer DataFrame into test cases, skipping unparseable answers."""
+    cases = (compile_case(question, answer) for question, answer in zip(df["Question"], df["Answer"]))
+    return [case for case in cases if case is not None]
+
+def evaluation_fingerprint(model_id, model_version, topic_name, question, expected_response):
+    """Hash of everything an evaluation's outcome depends on, so unchanged pairs can reuse their last result."""
+    return query_hash([model_id, model_version, topic_name, str(question), str(expected_response)])
+
+def model_label(index):
+    """Display label for the index-th model under evaluation (Model A, Model B, ...)."""
+    return f"Model {chr(ord('A') + index)}"
+
+class SharedExecutions:
+    """Runs each distinct API call once and shares its result with every task that needs it.
+
+    Query executions are keyed by the query's canonical hash, so models (or duplicate
+    questions) that produce the same query wait on one execution instead of starting their
+    own; query generation is keyed by model and prompt, which dedupes repeated questions.
+    Finished results are kept, up to max_entries and max_bytes, for tasks that need them
+    later in the run, unless run is told not to keep them.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 ** 2, max_entries=1000):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.executed = 0
+        self.saved = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}           # key -> Future of the result
+        self._results = OrderedDict()  # key -> result, least recently used first
+        self._bytes = 0
+
+    def run(self, key, execute, keep=True):
+        """Result of execute() for a key, running it only if no other task has; returns (result, shared).
+
+        With keep=False the result is only shared with tasks that ask while it's running.
+        """
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.saved += 1
+                return self._results[key], True
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self.saved += 1
+        if not owner:
+            return future.result(), True
+
+        try:
+            result = execute()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+            self.executed += 1
+            # Failures aren't kept, so a later task can try again
+            if result is not None and keep:
+                self._results[key] = result
+                self._bytes += getattr(result, "nbytes", 0)
+                while len(self._results) > 1 and (self._bytes > self.max_bytes
+                                                  or len(self._results) > self.max_entries):
+                    self._bytes -= getattr(self._results.popitem(last=False)[1], "nbytes", 0)
+        future.set_result(result)
+        return result, False
+
+class Evaluator:
+    """Generates and runs queries against Omni models and scores them against expected answers.
+
+    Problems are reported through the module logger rather than raised, so a single bad
+    question never aborts a suite run.
+    """
+
+    def __init__(self, http_client, omni_client, topic_name, cache=None, bypass_cache=False, blobs=None,
+                 worker_config=None, limits=None):
+        self.http_client = http_client
+        self.omni_client = omni_client
+        self.topic_name = topic_name
+        self.cache = cache
+        self.bypass_cache = bypass_cache
+        # Where table results are saved; records reference them by ID instead of inlining them
+        self.blobs = blobs
+        # Picklable settings to rebuild this evaluator in a worker process (see sharded_runner)
+        self.worker_config = worker_config
+        # Optional ConcurrencyController that adapts how many calls run per endpoint and model
+        self.limits = limits
+        self._model_versions = {}
+        self._versions_lock = threading.Lock()
+
+    def model_version(self, model_id):
+        """Content hash of a model's YAML, fetched once per evaluator; None if Omni doesn't return it."""
+        # The lock only guards the dict: the first caller fetches, and the rest wait for its result
+        with self._versions_lock:
+            version = self._model_versions.get(model_id)
+            fetch = version is None
+            if fetch:
+                version = self._model_versions[model_id] = Future()
+        if fetch:
+            version.set_result(self._fetch_model_version(model_id))
+        return version.result()
+
+    def _fetch_model_version(self, model_id):
+        try:
+            response, _, _ = self.http_client.model_yaml(model_id)
+            model_yaml = response.json() if response.status_code == 200 else None
+        except Exception as e:
+            logger.warning(f"Error fetching the YAML for model {model_id}: {str(e)}")
+            model_yaml = None
+        if not model_yaml:
+            logger.warning(f"Could not fetch the YAML for model {model_id}; its results won't be reused")
+        return query_hash(model_yaml) if model_yaml else None
+
+    def fingerprint(self, question_data, model_id):
+        """The evaluation fingerprint of a test case against a model (see evaluation_fingerprint)."""
+        return evaluation_fingerprint(model_id, self.model_version(model_id), self.topic_name,
+                                      question_data['question'], question_data['expected_response'])
+
+    def reused_record(self, question_data, label, model_id, reuse):
+        """A record reusing the stored result of an unchanged test case and model, or None if it must run.
+
+        reuse maps an evaluation fingerprint to the latest stored record with it, or None
+        (see EvaluationStore.reusable_record). Pairs whose model version is unknown always run.
+        """
+        if self.model_version(model_id) is None:
+            return None
+        eval_fingerprint = self.fingerprint(question_data, model_id)
+        previous = reuse(eval_fingerprint)
+        if previous is None:
+            return None
+        return {
+            "timestamp": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "model": label,
+            "model_id": model_id,
+            "prompt": question_data['question'],
+            "expected_response": question_data['expected_response'],
+            "actual_response": previous["actual_response"],
+            "actual_response_id": previous["actual_response_id"],
+            "result": previous["result"],
+            "eval_fingerprint": eval_fingerprint,
+            "reused": True,
+            "reused_from_run": previous["run_id"]
+        }
+
+    def _slot(self, endpoint, model_id):
+        return self.limits.slot(endpoint, model_id) if self.limits is not None else nullcontext({})
+
+    def query_data(self, prompt, model_id, stats=None, shared=None):
+        """Generate and run a query for a prompt; returns (Arrow table, query dict).
+
+        If stats is given it receives the retry count, per-phase timings (generate_latency_s,
+        run_query_s), payload sizes and row count, and whether generation and execution were
+        shared. Phases skipped thanks to the cache or sharing are left as None. Pass a
+        SharedExecutions to generate and run queries that other calls also need only once.
+        """
+        try:
+            if not prompt or not model_id:
+                logger.error("Missing prompt or model ID")
+                return None, None
+
+            use_cache = self.cache is not None and not self.bypass_cache
+            # Queries are cached per model version, so an edited model generates them afresh
+            version = self.model_version(model_id) if self.cache is not None else None
+            query_dict = self.cache.get_query(self.topic_name, model_id, prompt, version) if use_cache else None
+            if stats is not None:
+                stats.update({"retries": 0, "cache_hit": query_dict is not None})
+
+            def generate():
+                with self._slot("generate", model_id) as call:
+                    response, retries, latency = self.http_client.generate_query(self.topic_name, model_id, prompt)
+                    call["latency"] = latency
+                    # Retried responses were 429s or server errors, so treat them as backpressure too
+                    if response.status_code == 429 or retries:
+                        call["outcome"] = "throttled"
+                    elif response.status_code >= 500:
+                        call["outcome"] = "error"
+                if stats is not None:
+                    stats.update({"retries": retries, "generate_latency_s": round(latency, 4),
+                                  "query_bytes": len(response.content)})
+
+                if response.status_code != 200:
+                    logger.error(f"API Error: {response.status_code}")
+                    return None
+
+                query_dict = response.json()
+                if not query_dict:
+                    logger.error("Empty response from API")
+                    return None
+                if self.cache is not None:
+                    self.cache.put_query(self.topic_name, model_id, prompt, query_dict, version)
+                return query_dict
+
+            if query_dict is None:
+                generate_key = ("generate", self.topic_name, model_id, prompt)
+                # Only the tasks waiting on it need a generated query, since its model has then
+                # used it; the query cache serves it to any later duplicate question
+                query_dict, was_shared = (shared.run(generate_key, generate, keep=False) if shared is not None
+                                          else (generate(), False))
+                if stats is not None:
+                    stats["shared_generation"] = was_shared
+                if query_dict is None:
+                    return None, None
+
+            table = self.cache.get_result(query_dict) if use_cache else None
+            if table is not None:
+                if table.num_rows == 0:
+                    logger.warning("Query returned empty result")
+                if stats is not None:
+                    stats.update({"result_bytes": table.nbytes, "result_rows": table.num_rows})
+                return table, query_dict
+
+            def execute():
+                with self._slot("run", model_id) as call:
+                    start = time.perf_counter()
+                    query_result = self.omni_client.run_query_blocking(query_dict)
+                    call["latency"] = time.perf_counter() - start
+                    if query_result is None:
+                        call["outcome"] = "error"
+                if stats is not None:
+                    stats["run_query_s"] = round(call["latency"], 4)
+                if query_result is None:
+                    logger.error("No query result returned")
+                    return None
+
+                table, _ = query_result
+                if table is None:
+                    logger.error("Query result is None")
+                    return None
+                if self.cache is not None:
+                    self.cache.put_result(query_dict, table)
+                return table
+
+            run_key = ("run", query_hash(query_dict))
+            table, was_shared = shared.run(run_key, execute) if shared is not None else (execute(), False)
+            if stats is not None:
+                stats["shared_execution"] = was_shared
+            if table is None:
+                return None, None
+
+            if stats is not None:
+                stats.update({"result_bytes": table.nbytes, "result_rows": table.num_rows})
+            if table.num_rows == 0:
+                logger.warning("Query returned empty result")
+            return table, query_dict
+
+        except Exception as e:
+            logger.error(f"Error in query_data: {str(e)}")
+            return None, None
+
+    def evaluate(self, question_data, label, model_id, shared=None):
+        """Run one test case against one model and build its evaluation record, or None on error.
+
+        Cases streamed from a suite file arrive unparsed; their expected answer is parsed here,
+        once per question, and kept on the case for the other models.
+        """
+        if 'parsed_response' not in question_data:
+            case = compile_case(question_data['question'], question_data['expected_response'])
+            if case is None:
+                logger.error(f"Could not parse the expected answer for: {question_data['question']}")
+                return None
+            question_data.update(case)
+
+        stats = {}
+        table, _ = self.query_data(question_data['question'], model_id, stats=stats, shared=shared)
+        if table is None:
+            return None
+
+        start = time.perf_counter()
+        passed = compare_results(table, question_data['parsed_response'], question_data.get('fingerprint'))
+        compare_s = round(time.perf_counter() - start, 4)
+
+        actual_response_id = None
+        if isinstance(question_data['parsed_response'], (pd.DataFrame, pa.Table)):
+            actual_response = f"{table.num_rows} rows × {table.num_columns} columns"
+            if self.blobs is not None:
+                actual_response_id = self.blobs.save(table)
+        else:
+            actual_response = str(table.column(0)[0].as_py()) if table.num_rows and table.num_columns else ""
+        return {
+            "timestamp": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "model": label,
+            "model_id": model_id,
+            "prompt": question_data['question'],
+            "expected_response": question_data['expected_response'],
+            "actual_response": actual_response,
+            "actual_response_id": actual_response_id,
+            "result": PASS if passed else FAIL,
+            "retries": stats.get("retries"),
+            "generate_latency_s": stats.get("generate_latency_s"),
+            "run_query_s": stats.get("run_query_s"),
+            "compare_s": compare_s,
+            "query_bytes": stats.get("query_bytes"),
+            "result_bytes": stats.get("result_bytes"),
+            "result_rows": stats.get("result_rows"),
+            "shared_generation": stats.get("shared_generation", False),
+            "shared_execution": stats.get("shared_execution", False),
+            "eval_fingerprint": self.fingerprint(question_data, model_id),
+            "reused": False
+        }
+
+    def run_suite(self, questions, models, max_workers=8, on_progress=None, on_record=None,
+                  skip=(), on_task=None, gate=None, keep_records=True, reuse=None):
+        """Run every question against every model with at most max_workers queries in flight.
+
+        questions can be any iterable, including a generator or a streamed suite; it's read
+        only as fast as tasks complete, so memory stays flat however large the suite is.
+        models is a list of (label, model_id) pairs. Tasks are numbered question-major
+        (question index * len(models) + model index); indices in skip are not run, which
+        is how checkpointed runs resume. on_progress gets the completed fraction (only when
+        questions has a length), on_record each record and on_task (index, record or None)
+        for every finished task, all called from the calling thread as tasks finish. gate is
+        called in the worker before each task starts; it may block (to pause) and returns
+        False to cancel the task.
+        Identical queries, whether from different models or duplicate questions, are run
+        once and shared (see SharedExecutions); records say whether their result was shared.
+        Pass reuse (see reused_record) to only run pairs that are new or changed since they
+        were last evaluated; the others get a record reusing the stored result.
+        Returns the evaluation records ordered by question and then by model, regardless
+        of the order in which the queries finished; failed queries are left out. Pass
+        keep_records=False to rely on the callbacks alone and get an empty list back.
+        """
+        total = len(questions) * len(models) if hasattr(questions, "__len__") else None
+        skip = set(skip)
+        records = {}
+        shared = SharedExecutions()
+
+        def tasks():
+            for question_index, question_data in enumerate(questions):
+                for model_index, (label, model_id) in enumerate(models):
+                    index = question_index * len(models) + model_index
+                    if index not in skip:
+                        yield index, (question_data, label, model_id)
+
+        def run_task(question_data, label, model_id):
+            if reuse is not None:
+                record = self.reused_record(question_data, label, model_id, reuse)
+                if record is not None:
+                    return record
+            return self.evaluate(question_data, label, model_id, shared=shared)
+
+        def on_done(index, record, done):
+            if keep_records and record is not None:
+                records[index] = record
+            if on_task:
+                on_task(index, record)
+            if on_record and record is not None:
+                on_record(record)
+            if on_progress and total:
+                on_progress((len(skip) + done) / total)
+
+        _run_bounded(tasks(), run_task, max_workers, on_done, gate)
+        return [records[index] for index in sorted(records)]
+
+    def replay_prompt(self, prompt_data, models, shared=None):
+        """Run one production prompt against every model and compare each pair of results.
+
+        There's no expected answer, so models are only checked against each other. Returns
+        one record per pair of models whose queries both succeeded; its result is PASS when
+        the two returned the same data and FAIL when they disagree.
+        """
+        tables = {label: self.query_data(prompt_data['question'], model_id, shared=shared)[0]
+                  for label, model_id in models}
+        records, fingerprints = [], {}
+        for i, (label_a, model_a) in enumerate(models):
+            for label_b, model_b in models[i + 1:]:
+                table_a, table_b = tables[label_a], tables[label_b]
+                if table_a is None or table_b is None:
+                    continue
+                if label_a not in fingerprints:
+                    fingerprints[label_a] = table_fingerprint(table_a)
+                agree = compare_results(table_b, table_a, fingerprints[label_a])
+                records.append({
+                    "timestamp": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "kind": "replay",
+                    "model": f"{label_a} vs {label_b}",
+                    "model_id": f"{model_a} vs {model_b}",
+                    "prompt": prompt_data['question'],
+                    "actual_response": f"{table_a.num_rows} vs {table_b.num_rows} rows",
+                    "result": PASS if agree else FAIL,
+                    "stratum": prompt_data.get('stratum')
+                })
+        return records
+
+    def run_replay(self, prompts, models, max_workers=8, on_progress=None, on_record=None,
+                   skip=(), on_task=None, gate=None, keep_records=True):
+        """Replay prompts without expected answers against every model (see replay_prompt).
+
+        Works like run_suite, but a task is one prompt across all models, numbered by its
+        position in prompts; on_task gets (index, list of that prompt's pair records).
+        Returns the records ordered by prompt, or an empty list with keep_records=False.
+        """
+        total = len(prompts) if hasattr(prompts, "__len__") else None
+        skip = set(skip)
+        records = {}
+        shared = SharedExecutions()
+
+        def tasks():
+            for index, prompt_data in enumerate(prompts):
+                if index not in skip:
+                    yield index, (prompt_data,)
+
+        def on_done(index, prompt_records, done):
+            if keep_records:
+                records[index] = prompt_records
+            if on_task:
+                on_task(index, prompt_records)
+            if on_record:
+                for record in prompt_records:
+                    on_record(record)
+            if on_progress and total:
+                on_progress((len(skip) + done) / total)
+
+        _run_bounded(tasks(), lambda prompt_data: self.replay_prompt(prompt_data, models, shared=shared),
+                     max_workers, on_done, gate)
+        return [record for index in sorted(records) for record in records[index]]
+
+
+def _run_bounded(tasks, run_task, max_workers, on_done, gate=None):
+    """Run (index, args) tasks on a thread pool, pulling from tasks only as they finish.
+
+    At most 2 * max_workers tasks are submitted at a time, so tasks can be an arbitrarily
+    long generator. on_done(index, result, done_count) is called from the calling thread.
+    gate is called in the worker before each task starts; it may block (to pause) and
+    returns False to cancel the task, which then isn't reported.
+    """
+    cancelled = object()
+
+    def run(args):
+        if gate and not gate():
+            return cancelled
+        return run_task(*args)
+
+    done = 0
+    # Pool threads are named after the calling thread, so their log messages can be traced to the run
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=threading.current_thread().name) as executor:
+        # Keep a small queue of submitted tasks rather than submitting the whole run
+        futures = {}
+        for index, args in tasks:
+            futures[executor.submit(run, args)] = index
+            if len(futures) >= 2 * max_workers:
+                break
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = futures.pop(future)
+                done += 1
+                next_task = next(tasks, None)
+                if next_task is not None:
+                    futures[executor.submit(run, next_task[1])] = next_task[0]
+
+                result = future.result()
+                if result is not cancelled:
+                    on_done(index, result, done)
@@ -0,0 +1,502 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from evaluation import FAIL, PASS
+from metrics import METRICS, bucket_for
+
+# Record fields stored in their own columns; anything else goes into the JSON extra column
+COLUMNS = ["run_id", "timestamp", "kind", "model", "model_id", "prompt", "expected_response",
+           "actual_response", "actual_response_id", "result", "feedback", "note", "retries", "generate_latency_s",
+           "eval_fingerprint"]
+
+# Columns shown in the history table for each kind of evaluation
+HISTORY_COLUMNS = {
+    "suite": ["timestamp", "run_id", "model", "prompt", "expected_response", "actual_response",
+              "actual_response_id", "result", "retries", "generate_latency_s"],
+    "feedback": ["timestamp", "model", "prompt", "feedback", "note"],
+    "replay": ["timestamp", "run_id", "model", "prompt", "actual_response", "result"],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS evaluations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT,
+    timestamp TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    model TEXT,
+    model_id TEXT,
+    prompt TEXT,
+    expected_response TEXT,
+    actual_response TEXT,
+    actual_response_id TEXT,
+    result TEXT,
+    feedback TEXT,
+    note TEXT,
+    retries INTEGER,
+    generate_latency_s REAL,
+    eval_fingerprint TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_evaluations_kind_timestamp ON evaluations (kind, timestamp);
+CREATE INDEX IF NOT EXISTS idx_evaluations_model_id ON evaluations (kind, model_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_evaluations_prompt ON evaluations (kind, prompt, timestamp);
+CREATE INDEX IF NOT EXISTS idx_evaluations_run_id ON evaluations (kind, run_id, timestamp);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    models TEXT
+);
+CREATE TABLE IF NOT EXISTS summary (
+    scope TEXT NOT NULL,
+    scope_key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    model TEXT NOT NULL,
+    model_id TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    passed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    thumbs_up INTEGER NOT NULL DEFAULT 0,
+    thumbs_down INTEGER NOT NULL DEFAULT 0,
+    latency_count INTEGER NOT NULL DEFAULT 0,
+    latency_sum REAL NOT NULL DEFAULT 0,
+    latency_min REAL,
+    latency_max REAL,
+    shared INTEGER NOT NULL DEFAULT 0,
+    reused INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, scope_key, kind, model, model_id)
+);
+CREATE TABLE IF NOT EXISTS metric_histograms (
+    scope TEXT NOT NULL,
+    scope_key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    model TEXT NOT NULL,
+    model_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    total REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, scope_key, kind, model, model_id, metric, bucket)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    run_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    spec TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_tasks (
+    run_id TEXT NOT NULL,
+    task_index INTEGER NOT NULL,
+    PRIMARY KEY (run_id, task_index)
+);
+"""
+
+# Columns added after the first release, as (table, column, definition), for upgrading old stores
+ADDED_COLUMNS = [
+    ("evaluations", "actual_response_id", "TEXT"),
+    ("summary", "shared", "INTEGER NOT NULL DEFAULT 0"),
+    ("evaluations", "eval_fingerprint", "TEXT"),
+    ("summary", "reused", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+# Running per-model counters, bumped in the same transaction as each appended record.
+# Scopes: "all" (scope_key ''), "run" (keyed by run ID) and "question" (keyed by prompt).
+SUMMARY_UPSERT = """
+INSERT INTO summary (scope, scope_key, kind, model, model_id, total, passed, failed, thumbs_up, thumbs_down,
+                     latency_count, latency_sum, latency_min, latency_max, shared, reused)
+VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (scope, scope_key, kind, model, model_id) DO UPDATE SET
+    total = total + 1,
+    passed = passed + excluded.passed,
+    failed = failed + excluded.failed,
+    thumbs_up = thumbs_up + excluded.thumbs_up,
+    thumbs_down = thumbs_down + excluded.thumbs_down,
+    latency_count = latency_count + excluded.latency_count,
+    latency_sum = latency_sum + excluded.latency_sum,
+    latency_min = CASE WHEN latency_min IS NULL OR excluded.latency_min < latency_min
+                       THEN excluded.latency_min ELSE latency_min END,
+    latency_max = CASE WHEN latency_max IS NULL OR excluded.latency_max > latency_max
+                       THEN excluded.latency_max ELSE latency_max END,
+    shared = shared + excluded.shared,
+    reused = reused + excluded.reused
+"""
+
+# Log-bucketed histograms of per-phase timings and payload sizes, for "all" and "run" scopes
+HISTOGRAM_UPSERT = """
+INSERT INTO metric_histograms (scope, scope_key, kind, model, model_id, metric, bucket, count, total)
+VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?)
+ON CONFLICT (scope, scope_key, kind, model, model_id, metric, bucket) DO UPDATE SET
+    count = count + 1,
+    total = total + excluded.total
+"""
+
+# Summary counters for one scope computed from the records themselves
+SUMMARY_SELECT = """
+SELECT ? AS scope, {scope_key} AS scope_key, kind, COALESCE(model, '') AS model, COALESCE(model_id, '') AS model_id,
+       COUNT(*) AS total, SUM(IFNULL(result = ?, 0)) AS passed, SUM(IFNULL(result = ?, 0)) AS failed,
+       SUM(IFNULL(feedback = '👍', 0)) AS thumbs_up, SUM(IFNULL(feedback = '👎', 0)) AS thumbs_down,
+       COUNT(generate_latency_s) AS latency_count, COALESCE(SUM(generate_latency_s), 0) AS latency_sum,
+       MIN(generate_latency_s) AS latency_min, MAX(generate_latency_s) AS latency_max,
+       SUM(IFNULL(json_extract(extra, '$.shared_execution'), 0)) AS shared,
+       SUM(IFNULL(json_extract(extra, '$.reused'), 0)) AS reused
+FROM evaluations {where}
+GROUP BY 2, kind, COALESCE(model, ''), COALESCE(model_id, '')
+"""
+
+# Rebuilds the counters for one scope from existing records (stores created before the summary table)
+SUMMARY_REBUILD = "INSERT INTO summary" + SUMMARY_SELECT
+
+
+class EvaluationStore:
+    """Append-only SQLite store for evaluation records, queried page by page."""
+
+    def __init__(self, path="evaluations.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        for table, column, definition in ADDED_COLUMNS:
+            if column not in {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        # Created here rather than in SCHEMA, since old stores only get the column above
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_evaluations_fingerprint ON evaluations (eval_fingerprint, id)")
+        with self._lock, self._conn:
+            has_summary = self._conn.execute("SELECT 1 FROM summary LIMIT 1").fetchone()
+            if not has_summary and self._conn.execute("SELECT 1 FROM evaluations LIMIT 1").fetchone():
+                self._rebuild_summary()
+
+    def _rebuild_summary(self):
+        self._conn.execute("DELETE FROM summary")
+        for scope, scope_key, where in [("all", "''", ""),
+                                        ("run", "run_id", "WHERE run_id IS NOT NULL"),
+                                        ("question", "COALESCE(prompt, '')", "")]:
+            self._conn.execute(SUMMARY_REBUILD.format(scope_key=scope_key, where=where), (scope, PASS, FAIL))
+
+    def start_run(self, kind="suite", models=None):
+        """Register a new run and return its ID."""
+        run_id = uuid.uuid4().hex[:12]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO runs (run_id, started_at, kind, models) VALUES (?, ?, ?, ?)",
+                (run_id, pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"), kind, json.dumps(models or []))
+            )
+        return run_id
+
+    def append(self, record, run_id=None):
+        """Append a single evaluation record; suite records are those with a result."""
+        self.append_many([record], run_id)
+
+    def append_many(self, records, run_id=None):
+        with self._lock, self._conn:
+            self._insert(records, run_id)
+
+    def _insert(self, records, run_id):
+        """Insert records and bump their summary counters; caller holds the lock and transaction."""
+        rows, counter_rows, histogram_rows = [], [], []
+        for record in records:
+            row = dict(record)
+            row.setdefault("run_id", run_id)
+            row.setdefault("kind", "suite" if "result" in row else "feedback")
+            extra = {k: v for k, v in row.items() if k not in COLUMNS}
+            rows.append([row.get(col) for col in COLUMNS] + [json.dumps(extra, default=str) if extra else None])
+
+            latency = row.get("generate_latency_s")
+            counts = [row.get("result") == PASS, row.get("result") == FAIL,
+                      row.get("feedback") == "👍", row.get("feedback") == "👎",
+                      latency is not None, latency or 0.0, latency, latency, bool(row.get("shared_execution")),
+                      bool(row.get("reused"))]
+            key = [row["kind"], row.get("model") or "", row.get("model_id") or ""]
+            counter_rows.append(["all", ""] + key + counts)
+            counter_rows.append(["question", row.get("prompt") or ""] + key + counts)
+            if row["run_id"]:
+                counter_rows.append(["run", row["run_id"]] + key + counts)
+
+            for metric in METRICS:
+                value = row.get(metric)
+                if value is None:
+                    continue
+                histogram_rows.append(["all", ""] + key + [metric, bucket_for(value), value])
+                if row["run_id"]:
+                    histogram_rows.append(["run", row["run_id"]] + key + [metric, bucket_for(value), value])
+
+        placeholders = ", ".join("?" * (len(COLUMNS) + 1))
+        self._conn.executemany(
+            f"INSERT INTO evaluations ({', '.join(COLUMNS)}, extra) VALUES ({placeholders})", rows
+        )
+        self._conn.executemany(SUMMARY_UPSERT, counter_rows)
+        self._conn.executemany(HISTOGRAM_UPSERT, histogram_rows)
+
+    def save_job(self, run_id, spec, total, status="running"):
+        """Record a background suite job so it can be resumed after a restart."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (run_id, status, total, spec, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (run_id, status, total, json.dumps(spec, default=str), pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+
+    def set_job_status(self, run_id, status):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE run_id = ?",
+                (status, pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"), run_id)
+            )
+
+    def get_job(self, run_id):
+        """A job's status, total task count, completed task count and spec, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT status, total, spec FROM jobs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None:
+                return None
+            completed = self._conn.execute("SELECT COUNT(*) FROM job_tasks WHERE run_id = ?", (run_id,)).fetchone()[0]
+        return {"run_id": run_id, "status": row[0], "total": row[1], "completed": completed, "spec": json.loads(row[2])}
+
+    def unfinished_jobs(self):
+        """Run IDs of jobs that were running or paused when last seen, or that ended with failed tasks, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT run_id FROM jobs WHERE status IN ('running', 'paused')
+                       OR (status IN ('done', 'failed')
+                           AND (SELECT COUNT(*) FROM job_tasks WHERE job_tasks.run_id = jobs.run_id) < total)
+                   ORDER BY updated_at DESC"""
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def completed_tasks(self, run_id):
+        with self._lock:
+            rows = self._conn.execute("SELECT task_index FROM job_tasks WHERE run_id = ?", (run_id,)).fetchall()
+        return {row[0] for row in rows}
+
+    def complete_task(self, run_id, task_index, record):
+        """Checkpoint a finished task together with its record.
+
+        Replay tasks pass a list of records instead, one per pair of models compared. Failed
+        tasks (no record) aren't checkpointed, so resuming the job runs them again.
+        """
+        if not record:
+            return
+        with self._lock, self._conn:
+            self._insert(record if isinstance(record, list) else [record], run_id)
+            self._conn.execute("INSERT OR IGNORE INTO job_tasks (run_id, task_index) VALUES (?, ?)",
+                               (run_id, task_index))
+
+    def reusable_record(self, eval_fingerprint):
+        """The latest suite record with this evaluation fingerprint, or None; used by changed-only runs."""
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT run_id, actual_response, actual_response_id, result FROM evaluations
+                   WHERE eval_fingerprint = ? AND kind = 'suite' ORDER BY id DESC LIMIT 1""",
+                (eval_fingerprint,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(["run_id", "actual_response", "actual_response_id", "result"], row))
+
+    @staticmethod
+    def _where(kind=None, model_id=None, run_id=None, prompt=None):
+        clauses, params = [], []
+        for col, value in [("kind", kind), ("model_id", model_id), ("run_id", run_id)]:
+            if value:
+                clauses.append(f"{col} = ?")
+                params.append(value)
+        if prompt:
+            # Prefix match as a range so the prompt index can be used
+            clauses.append("prompt >= ? AND prompt < ?")
+            params.extend([prompt, prompt + "\U0010ffff"])
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count(self, kind=None, model_id=None, run_id=None, prompt=None):
+        """Number of matching records; answered from the summary counters unless filtering by prompt."""
+        if prompt:
+            where, params = self._where(kind=kind, model_id=model_id, run_id=run_id, prompt=prompt)
+            with self._lock:
+                return self._conn.execute(f"SELECT COUNT(*) FROM evaluations{where}", params).fetchone()[0]
+        return int(self.summary(kind=kind, model_id=model_id, run_id=run_id)["total"].sum())
+
+    def query(self, columns=None, limit=50, offset=0, **filters):
+        """One page of records, newest first, as a DataFrame."""
+        where, params = self._where(**filters)
+        select = ", ".join(columns) if columns else "*"
+        with self._lock:
+            return pd.read_sql_query(
+                f"SELECT {select} FROM evaluations{where} ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+                self._conn, params=params + [limit, offset]
+            )
+
+    def model_ids(self, kind=None):
+        """Model IDs with at least one record, read from the summary counters."""
+        return sorted(set(self.summary(kind=kind)["model_id"]) - {""})
+
+    def runs(self, kind=None, limit=100):
+        """Most recent runs, newest first."""
+        where, params = self._where(kind=kind)
+        with self._lock:
+            return pd.read_sql_query(
+                f"SELECT * FROM runs{where} ORDER BY started_at DESC LIMIT ?", self._conn, params=params + [limit]
+            )
+
+    def _summary_query(self, scope, scope_key=None, kind=None, model_id=None, limit=None, offset=0):
+        clauses, params = ["scope = ?"], [scope]
+        for col, value in [("scope_key", scope_key), ("kind", kind), ("model_id", model_id)]:
+            if value is not None:
+                clauses.append(f"{col} = ?")
+                params.append(value)
+        sql = f"SELECT * FROM summary WHERE {' AND '.join(clauses)} ORDER BY scope_key, model, model_id"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def summary(self, kind=None, model_id=None, run_id=None):
+        """Per-model counters for all records, or for a single run."""
+        if run_id:
+            return self._summary_query("run", run_id, kind=kind, model_id=model_id)
+        return self._summary_query("all", "", kind=kind, model_id=model_id)
+
+    def metric_histograms(self, kind=None, run_id=None, model_id=None):
+        """Histogram buckets for every tracked metric, for all records or a single run."""
+        clauses, params = ["scope = ?", "scope_key = ?"], ["run", run_id] if run_id else ["all", ""]
+        for col, value in [("kind", kind), ("model_id", model_id)]:
+            if value is not None:
+                clauses.append(f"{col} = ?")
+                params.append(value)
+        with self._lock:
+            return pd.read_sql_query(
+                f"""SELECT model, model_id, metric, bucket, count, total FROM metric_histograms
+                    WHERE {' AND '.join(clauses)}""",
+                self._conn, params=params
+            )
+
+    def question_summary(self, kind=None, model_id=None, run_id=None, limit=50, offset=0):
+        """Per-model counters for one page of questions, plus the total number of questions.
+
+        Question counters are kept across all runs, so a single run's are computed from its records.
+        """
+        if run_id:
+            return self._run_question_summary(run_id, kind, model_id, limit, offset)
+        where, params = "scope = 'question'", []
+        for col, value in [("kind", kind), ("model_id", model_id)]:
+            if value:
+                where += f" AND {col} = ?"
+                params.append(value)
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(DISTINCT scope_key) FROM summary WHERE {where}", params).fetchone()[0]
+            page = pd.read_sql_query(
+                f"""SELECT * FROM summary WHERE {where} AND scope_key IN (
+                        SELECT DISTINCT scope_key FROM summary WHERE {where} ORDER BY scope_key LIMIT ? OFFSET ?
+                    ) ORDER BY scope_key, model, model_id""",
+                self._conn, params=params + params + [limit, offset]
+            )
+        return page, total
+
+    def _run_question_summary(self, run_id, kind, model_id, limit, offset):
+        where, params = "run_id = ?", [run_id]
+        for col, value in [("kind", kind), ("model_id", model_id)]:
+            if value:
+                where += f" AND {col} = ?"
+                params.append(value)
+        page_where = (f"WHERE {where} AND COALESCE(prompt, '') IN (SELECT DISTINCT COALESCE(prompt, '') "
+                      f"FROM evaluations WHERE {where} ORDER BY 1 LIMIT ? OFFSET ?)")
+        sql = SUMMARY_SELECT.format(scope_key="COALESCE(prompt, '')", where=page_where) + " ORDER BY 2, 4, 5"
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(DISTINCT COALESCE(prompt, '')) FROM evaluations WHERE {where}",
+                                       params).fetchone()[0]
+            page = pd.read_sql_query(sql, self._conn, params=["question", PASS, FAIL] + params + params + [limit, offset])
+        return page, total
+
+
+class ResultBlobStore:
+    """Query results saved as compressed Arrow IPC files, referenced from records by ID.
+
+    Blobs are named by the hash of their contents, so a result saved many times is stored
+    once. Like QueryCache's results they're LRU-bounded by count and total size; records
+    whose blob was evicted show it as no longer available.
+    """
+
+    def __init__(self, path="results", max_blobs=20000, max_bytes=5 * 1024 ** 3):
+        self.path = path
+        self.max_blobs = max_blobs
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._blobs = OrderedDict()   # blob ID -> size_bytes
+        self._bytes = 0
+
+        # Rebuild the index from disk, oldest first so LRU order survives restarts
+        os.makedirs(path, exist_ok=True)
+        entries = []
+        for name in os.listdir(path):
+            if name.endswith(".arrow"):
+                st = os.stat(os.path.join(path, name))
+                entries.append((st.st_mtime, name[:-len(".arrow")], st.st_size))
+        for _, blob_id, size in sorted(entries):
+            self._blobs[blob_id] = size
+            self._bytes += size
+
+    def _file(self, blob_id):
+        return os.path.join(self.path, f"{blob_id}.arrow")
+
+    def save(self, table):
+        """Write a table unless the same contents are already saved, and return its ID."""
+        sink = pa.BufferOutputStream()
+        options = ipc.IpcWriteOptions(compression="zstd")
+        with ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        data = sink.getvalue()
+        blob_id = hashlib.sha256(data).hexdigest()
+        path = self._file(blob_id)
+        with self._lock:
+            # Indexed as the newest blob before the file is touched, so no other save here evicts it
+            self._bytes += data.size - self._blobs.pop(blob_id, 0)
+            self._blobs[blob_id] = data.size
+            while len(self._blobs) > 1 and (len(self._blobs) > self.max_blobs or self._bytes > self.max_bytes):
+                self._evict(next(iter(self._blobs)))
+        try:
+            # Touch it so the file's age still reflects its last use after a restart
+            os.utime(path)
+        except FileNotFoundError:
+            # Not saved yet, or evicted by another process in the meantime. Write to a temp
+            # file first so readers (in any process) never see a half-written file.
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return blob_id
+
+    def _evict(self, blob_id):
+        self._bytes -= self._blobs.pop(blob_id)
+        try:
+            os.remove(self._file(blob_id))
+        except FileNotFoundError:
+            pass
+
+    def load(self, blob_id, limit=None):
+        """Read a saved table, or just its first limit rows; None if the blob is gone."""
+        try:
+            reader = ipc.open_file(pa.memory_map(self._file(blob_id)))
+        except (OSError, pa.ArrowInvalid):
+            return None
+        with self._lock:
+            if blob_id in self._blobs:
+                self._blobs.move_to_end(blob_id)
+        if limit is None:
+            return reader.read_all()
+        batches, rows = [], 0
+        for i in range(reader.num_record_batches):
+            if rows >= limit:
+                break
+            batch = reader.get_batch(i)
+            batches.append(batch.slice(0, limit - rows))
+            rows += batches[-1].num_rows
+        return pa.Table.from_batches(batches, schema=reader.schema)
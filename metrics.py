@@ -0,0 +1,111 @@
+"""Per-phase latency and payload metrics: log-bucketed histograms, percentiles and exports."""
+import json
+import math
+import os
+
+import pandas as pd
+
+# Record fields tracked as histograms: (Prometheus metric name, unit, help text)
+METRICS = {
+    "generate_latency_s": ("blobby_eval_generate_query_seconds", "s", "Time spent in generate-query calls"),
+    "run_query_s": ("blobby_eval_run_query_seconds", "s", "Time spent in run_query_blocking"),
+    "compare_s": ("blobby_eval_compare_seconds", "s", "Time spent in compare_results"),
+    "query_bytes": ("blobby_eval_query_bytes", "bytes", "Size of generate-query responses"),
+    "result_bytes": ("blobby_eval_result_bytes", "bytes", "In-memory size of query results"),
+    "result_rows": ("blobby_eval_result_rows", "rows", "Rows returned by queries"),
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Buckets grow by 10% from 1e-3, so any value is reported within 10% of its true size
+BUCKET_BASE = 1e-3
+BUCKET_GROWTH = 1.1
+
+
+def bucket_for(value):
+    """Histogram bucket index for a non-negative value."""
+    if value <= BUCKET_BASE:
+        return 0
+    return 1 + int(math.log(value / BUCKET_BASE) / math.log(BUCKET_GROWTH))
+
+
+def bucket_upper(bucket):
+    """Upper bound of a bucket, used as the value reported for percentiles."""
+    return BUCKET_BASE * BUCKET_GROWTH ** bucket
+
+
+def percentiles(histograms, quantiles=QUANTILES):
+    """Approximate quantiles per model and metric from histogram rows.
+
+    histograms has model, model_id, metric, bucket, count and total columns (see
+    EvaluationStore.metric_histograms). Returns one row per model and metric with count,
+    sum and one column per quantile (p50, p95, ...).
+    """
+    rows = []
+    for (model, model_id, metric), group in histograms.groupby(["model", "model_id", "metric"], sort=True):
+        group = group.sort_values("bucket")
+        cumulative = group["count"].cumsum()
+        count = int(cumulative.iloc[-1])
+        row = {"model": model, "model_id": model_id, "metric": metric,
+               "count": count, "sum": float(group["total"].sum())}
+        for q in quantiles:
+            bucket = group["bucket"].iloc[int((cumulative >= q * count).to_numpy().argmax())]
+            row[f"p{round(q * 100)}"] = bucket_upper(bucket)
+        rows.append(row)
+    return pd.DataFrame(rows, columns=["model", "model_id", "metric", "count", "sum"]
+                        + [f"p{round(q * 100)}" for q in quantiles])
+
+
+def _labels(**labels):
+    escaped = {k: str(v).replace("\\", "\\\\").replace('"', '\\"') for k, v in labels.items()}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped.items()) + "}"
+
+
+def to_prometheus(summary, stats):
+    """Render pass/fail counters and metric summaries in the Prometheus text format."""
+    lines = ["# HELP blobby_eval_tests_total Evaluated test cases by result",
+             "# TYPE blobby_eval_tests_total counter"]
+    for _, row in summary.iterrows():
+        for result in ("passed", "failed"):
+            lines.append(f"blobby_eval_tests_total{_labels(model=row['model'], model_id=row['model_id'], result=result)} "
+                         f"{int(row[result])}")
+
+    for metric, (name, _, help_text) in METRICS.items():
+        metric_stats = stats[stats["metric"] == metric]
+        if metric_stats.empty:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+        for _, row in metric_stats.iterrows():
+            labels = {"model": row["model"], "model_id": row["model_id"]}
+            for q in QUANTILES:
+                lines.append(f"{name}{_labels(**labels, quantile=q)} {row[f'p{round(q * 100)}']:.6g}")
+            lines.append(f"{name}_sum{_labels(**labels)} {row['sum']:.6g}")
+            lines.append(f"{name}_count{_labels(**labels)} {int(row['count'])}")
+    return "\n".join(lines) + "\n"
+
+
+def to_json(summary, stats, run_id=None):
+    """Metrics as a JSON-serializable dict keyed by model."""
+    models = {}
+    for _, row in summary.iterrows():
+        models[row["model"]] = {"model_id": row["model_id"], "total": int(row["total"]),
+                                "passed": int(row["passed"]), "failed": int(row["failed"]), "metrics": {}}
+    for _, row in stats.iterrows():
+        entry = models.setdefault(row["model"], {"model_id": row["model_id"], "metrics": {}})
+        entry["metrics"][row["metric"]] = {k: row[k] for k in stats.columns if k not in ("model", "model_id", "metric")}
+    return {"generated_at": pd.Timestamp.now().isoformat(), "run_id": run_id, "models": models}
+
+
+def write_metrics(store, path, run_id=None):
+    """Export suite metrics for all runs, or one run, to a .prom or .json file."""
+    summary = store.summary(kind="suite", run_id=run_id)
+    stats = percentiles(store.metric_histograms(kind="suite", run_id=run_id))
+    if path.endswith(".json"):
+        content = json.dumps(to_json(summary, stats, run_id), indent=2, default=str)
+    else:
+        content = to_prometheus(summary, stats)
+    # Write atomically so scrapers never read a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
@@ -0,0 +1,212 @@
+"""Local stand-in for the Omni API, for offline runs and benchmarks.
+
+Serves generate-query, query execution and model YAML with configurable latency, error rates and
+result sizes:
+
+    python mock_server.py --port 8765 --generate-latency 0.3 --run-latency 0.5 --error-rate 0.02 --rows 1000
+
+then point the app or batch_eval.py at it with OMNI_BASE_URL=http://127.0.0.1:8765.
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+
+class MockConfig:
+    """Behaviour of the mock server; attributes can be changed while it is running."""
+
+    def __init__(self, generate_latency=0.0, run_latency=0.0, jitter=0.0, error_rate=0.0,
+                 rate_limit_rate=0.0, rows=10, distinct_queries=True, capacity=0, disagree_rate=0.0):
+        self.generate_latency = generate_latency
+        self.run_latency = run_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        # Requests beyond this many in flight on one endpoint get a 429, like an overloaded API (0 = unlimited)
+        self.capacity = capacity
+        self.rows = rows
+        # When False the generated query ignores the model ID, as if all models agreed
+        self.distinct_queries = distinct_queries
+        # Fraction of prompts for which a model's query returns an extra row, so models disagree
+        self.disagree_rate = disagree_rate
+        # Model ID -> version served in its YAML; bump one to simulate editing that model
+        self.model_versions = {}
+
+
+def generated_query(prompt, model_id, config):
+    """The query the mock "generates" for a prompt; deterministic so results can be predicted."""
+    query = {"query": {"table": "order_items", "fields": ["order_items.id", "order_items.sale_price"],
+                       "prompt": prompt, "limit": config.rows}}
+    if config.distinct_queries:
+        query["query"]["modelId"] = model_id
+    if config.disagree_rate:
+        # Which (prompt, model) pairs differ is decided by hash, so reruns give the same answers
+        digest = hashlib.sha256(f"{model_id}\0{prompt}".encode()).digest()
+        if int.from_bytes(digest[:4], "little") / 2 ** 32 < config.disagree_rate:
+            query["query"]["limit"] += 1
+    return query
+
+
+def result_table(query_dict):
+    """Deterministic result for a query dict, sized by the query's limit."""
+    query = query_dict.get("query", query_dict)
+    rows = int(query.get("limit") or 0)
+    seed = int.from_bytes(hashlib.sha256(str(query.get("prompt", "")).encode()).digest()[:4], "little")
+    rng = np.random.default_rng(seed)
+    return pa.table({
+        "order_items.id": np.arange(rows, dtype=np.int64),
+        "order_items.sale_price": np.round(rng.uniform(1, 500, rows), 2),
+    })
+
+
+def _encode_result(table):
+    buffer = io.BytesIO()
+    with ipc.new_stream(buffer, table.schema) as writer:
+        writer.write_table(table)
+    payload = {"result": base64.b64encode(buffer.getvalue()).decode("ascii"),
+               "summary": {"fields": [{"field_name": name} for name in table.column_names]}}
+    return (json.dumps(payload) + "\n" + json.dumps({"timed_out": "false"}) + "\n").encode("utf-8")
+
+
+class MockOmniHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay(self, latency):
+        config = self.server.config
+        time.sleep(max(0.0, latency + random.uniform(-config.jitter, config.jitter)))
+
+    def do_POST(self):
+        config = self.server.config
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.count_request(self.path)
+
+        if random.random() < config.rate_limit_rate:
+            return self._send(429, b'{"error": "rate limited"}')
+        if not self.server.enter(self.path, config.capacity):
+            return self._send(429, b'{"error": "over capacity"}')
+        try:
+            self._handle_post(config, body)
+        finally:
+            self.server.leave(self.path)
+
+    def _handle_post(self, config, body):
+        if random.random() < config.error_rate:
+            return self._send(500, b'{"error": "mock failure"}')
+
+        if self.path == "/api/unstable/ai/generate-query":
+            self._delay(config.generate_latency)
+            query = generated_query(body.get("prompt", ""), body.get("modelId", ""), config)
+            return self._send(200, json.dumps(query).encode("utf-8"))
+        if self.path == "/api/v1/query/run":
+            self._delay(config.run_latency)
+            return self._send(200, _encode_result(result_table(body)), "application/x-ndjson")
+        self._send(404, b'{"error": "not found"}')
+
+    def do_GET(self):
+        config = self.server.config
+        self.server.count_request(self.path.split("?")[0])
+        parts = self.path.split("?")[0].strip("/").split("/")
+        # /api/unstable/models/<model id>/yaml
+        if len(parts) == 5 and parts[:3] == ["api", "unstable", "models"] and parts[4] == "yaml":
+            version = config.model_versions.get(parts[3], 1)
+            model_yaml = {"files": {"model.yaml": f"# model {parts[3]} version {version}\n"}}
+            return self._send(200, json.dumps(model_yaml).encode("utf-8"))
+        self._send(404, b'{"error": "not found"}')
+
+
+class MockOmniServer(ThreadingHTTPServer):
+    """Threaded mock server; use start()/stop() to run it in the background."""
+
+    daemon_threads = True
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), MockOmniHandler)
+        self.config = config or MockConfig()
+        self.request_counts = {}
+        self.in_flight = {}
+        self._counts_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self, path):
+        with self._counts_lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    def enter(self, path, capacity):
+        """Count a request in flight on an endpoint; False if that would exceed its capacity."""
+        with self._counts_lock:
+            if capacity and self.in_flight.get(path, 0) >= capacity:
+                self.request_counts["429"] = self.request_counts.get("429", 0) + 1
+                return False
+            self.in_flight[path] = self.in_flight.get(path, 0) + 1
+            return True
+
+    def leave(self, path):
+        with self._counts_lock:
+            self.in_flight[path] -= 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-omni", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local mock of the Omni API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--generate-latency", type=float, default=0.0, help="Seconds per generate-query call")
+    parser.add_argument("--run-latency", type=float, default=0.0, help="Seconds per query execution")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- jitter added to latencies (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--capacity", type=int, default=0,
+                        help="Answer requests beyond this many in flight per endpoint with 429 (default: unlimited)")
+    parser.add_argument("--rows", type=int, default=10, help="Rows per query result")
+    parser.add_argument("--same-query", action="store_true",
+                        help="Generate the same query for every model, as if all models agreed")
+    parser.add_argument("--disagree-rate", type=float, default=0.0,
+                        help="Fraction of prompts for which each model returns an extra row, to simulate disagreement")
+    args = parser.parse_args(argv)
+
+    config = MockConfig(args.generate_latency, args.run_latency, args.jitter, args.error_rate,
+                        args.rate_limit_rate, args.rows, distinct_queries=not args.same_query,
+                        capacity=args.capacity, disagree_rate=args.disagree_rate)
+    server = MockOmniServer(config, args.host, args.port)
+    print(f"Mock Omni API listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
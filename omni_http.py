@@ -0,0 +1,76 @@
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class OmniHTTPClient:
+    """Shared keep-alive session for Omni API calls with timeouts and bounded retries."""
+
+    def __init__(self, base_url, api_key, pool_size=8, connect_timeout=5.0, read_timeout=120.0,
+                 max_retries=3, backoff=0.5, max_backoff=30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        # Size the pool to the suite's concurrency so parallel calls reuse connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+    def _retry_delay(self, attempt, response):
+        """Full-jitter exponential backoff, honouring Retry-After when the server sends one."""
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return min(float(response.headers["Retry-After"]), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def request(self, method, path, **kwargs):
+        """Send a request to an API path.
+
+        Returns (response, retries, latency_seconds). Connection errors and timeouts are
+        re-raised once the retry budget is spent; retryable status codes are returned as-is.
+        """
+        start = time.perf_counter()
+        retries = 0
+        while True:
+            response = None
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+                if response.status_code not in RETRY_STATUSES or retries >= self.max_retries:
+                    return response, retries, time.perf_counter() - start
+            except (requests.ConnectionError, requests.Timeout):
+                if retries >= self.max_retries:
+                    raise
+            time.sleep(self._retry_delay(retries, response))
+            retries += 1
+
+    def post(self, path, payload):
+        """POST JSON to an API path; see request."""
+        return self.request("POST", path, json=payload)
+
+    def get(self, path, params=None):
+        """GET an API path; see request."""
+        return self.request("GET", path, params=params)
+
+    def generate_query(self, topic_name, model_id, prompt):
+        """Ask Omni to generate a query for a prompt against a model's topic."""
+        return self.post("/api/unstable/ai/generate-query", {
+            "currentTopicName": topic_name,
+            "modelId": model_id,
+            "prompt": prompt
+        })
+
+    def model_yaml(self, model_id):
+        """Fetch a model's YAML files."""
+        return self.get(f"/api/unstable/models/{model_id}/yaml")
@@ -0,0 +1,307 @@
+"""Sample production prompt logs and replay them against several models, for nightly regression checks.
+
+Example:
+    python prompt_logs.py prompts.jsonl.gz --model <model id or URL> --model <model id or URL> \
+        --sample 500 --stratum-field topic --max-disagreement 5
+
+Logs are JSONL or CSV files (optionally gzipped) and are streamed a line or chunk at a
+time, so multi-GB logs are read in constant memory. Prompts are normalized and
+deduplicated with a Bloom filter, then a reservoir sample is kept, optionally per stratum
+(e.g. per topic or user segment) with strata represented in proportion to their
+unique prompts.
+Production prompts have no expected answers, so the sample is replayed against every
+model and each pair of models is checked for disagreeing results.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import sys
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from evaluation import PASS, extract_model_id_from_url, model_label
+from evaluation_store import EvaluationStore
+
+# Prompts from strata beyond this many are pooled into one, to keep memory bounded
+MAX_STRATA = 1000
+OTHER_STRATUM = "(other)"
+
+
+def normalize_prompt(prompt):
+    """Canonical form of a prompt for deduplication: whitespace collapsed and case folded."""
+    return " ".join(str(prompt).split()).casefold()
+
+
+class BloomFilter:
+    """Set membership in a fixed-size bit array: no false negatives, about error_rate false positives.
+
+    Sized for capacity distinct keys; past that the false positive rate climbs, so a few
+    unique prompts would be taken for duplicates and dropped from the sample.
+    """
+
+    def __init__(self, capacity=10_000_000, error_rate=0.001):
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    def add(self, key):
+        """Add a key; returns True if it wasn't (as far as the filter can tell) already there."""
+        return bool(self.add_many([key])[0])
+
+    def add_many(self, keys):
+        """Add a batch of keys at once; returns a boolean array, True for keys that were new.
+
+        A key repeated within the batch is only new the first time.
+        """
+        digests = np.frombuffer(b"".join(hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+                                         for key in keys), dtype="<u8").reshape(-1, 2)
+        # Double hashing: the k bit positions come from the two 64-bit halves of one digest
+        h1, h2 = digests[:, :1], digests[:, 1:] | np.uint64(1)
+        bits = (h1 + np.arange(self.num_hashes, dtype=np.uint64) * h2) % np.uint64(self.num_bits)
+        offsets, masks = bits >> np.uint64(3), np.left_shift(1, bits & np.uint64(7)).astype(np.uint8)
+        present = (self._bits[offsets] & masks).all(axis=1)
+        np.bitwise_or.at(self._bits, offsets.ravel(), masks.ravel())
+        first = np.zeros(len(keys), dtype=bool)
+        first[np.unique(digests, axis=0, return_index=True)[1]] = True
+        return ~present & first
+
+
+class Reservoir:
+    """Uniform random sample of up to size items from a stream of unknown length (Algorithm R)."""
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.items = []
+        self.seen = 0
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+        else:
+            j = self.rng.randrange(self.seen)
+            if j < self.size:
+                self.items[j] = item
+
+
+def _open_text(path):
+    return gzip.open(path, "rt", encoding="utf-8") if path.endswith(".gz") else open(path, encoding="utf-8")
+
+
+def read_prompts(path, field="prompt", stratum_field=None, stats=None, chunksize=10000):
+    """Stream (prompt, stratum) pairs from a JSONL or CSV log, picked by the file extension.
+
+    Lines that aren't valid JSON objects, or have no prompt, are skipped and counted in
+    stats["invalid"]; stats["lines"] counts every record read.
+    """
+    stats = stats if stats is not None else Counter()
+    name = path[:-len(".gz")] if path.endswith(".gz") else path
+    if name.endswith(".csv"):
+        columns = [field] + ([stratum_field] if stratum_field else [])
+        for chunk in pd.read_csv(path, usecols=columns, dtype=str, chunksize=chunksize):
+            strata = chunk[stratum_field] if stratum_field else [None] * len(chunk)
+            for prompt, stratum in zip(chunk[field], strata):
+                stats["lines"] += 1
+                if pd.isna(prompt) or not str(prompt).strip():
+                    stats["invalid"] += 1
+                    continue
+                yield prompt, None if stratum_field is None or pd.isna(stratum) else stratum
+        return
+
+    with _open_text(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            stats["lines"] += 1
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                entry = None
+            prompt = entry.get(field) if isinstance(entry, dict) else None
+            if not isinstance(prompt, str) or not prompt.strip():
+                stats["invalid"] += 1
+                continue
+            stratum = entry.get(stratum_field) if stratum_field else None
+            yield prompt, None if stratum is None else str(stratum)
+
+
+def sample_prompts(path, size=500, field="prompt", stratum_field=None, seed=None, capacity=10_000_000,
+                   error_rate=0.001):
+    """Deduplicated random sample of size prompts from a log; returns (cases, stats).
+
+    Cases are dicts with "question" (the prompt as first seen, trimmed) and "stratum",
+    ready for Evaluator.run_replay. With a stratum_field each stratum keeps its own
+    reservoir and gets a share of the sample proportional to its unique prompts, with at
+    least one prompt each while there's room. Memory is the Bloom filter (sized by capacity
+    and error_rate) plus the reservoirs, however long the log.
+    """
+    rng = random.Random(seed)
+    seen = BloomFilter(capacity, error_rate)
+    reservoirs = {}
+    stats = Counter()
+
+    def add_batch(batch):
+        # The filter is checked a batch at a time, which is much faster than per prompt
+        new = seen.add_many([normalize_prompt(prompt) for prompt, _ in batch])
+        stats["unique"] += int(new.sum())
+        stats["duplicates"] += int(len(batch) - new.sum())
+        for (prompt, stratum), is_new in zip(batch, new):
+            if not is_new:
+                continue
+            if stratum not in reservoirs and len(reservoirs) >= MAX_STRATA:
+                stratum = OTHER_STRATUM
+            if stratum not in reservoirs:
+                reservoirs[stratum] = Reservoir(size, rng)
+            reservoirs[stratum].add({"question": prompt.strip(), "stratum": stratum})
+
+    batch = []
+    for item in read_prompts(path, field, stratum_field, stats):
+        batch.append(item)
+        if len(batch) >= 10000:
+            add_batch(batch)
+            batch = []
+    if batch:
+        add_batch(batch)
+
+    # Every stratum gets one prompt if the sample allows, and the rest is shared out in
+    # proportion to each stratum's remaining prompts, by largest remainder
+    count = min(size, stats["unique"])
+    base = 1 if len(reservoirs) <= count else 0
+    rest = stats["unique"] - base * len(reservoirs)
+    shares = {stratum: (reservoir.seen - base) * (count - base * len(reservoirs)) / rest if rest else 0
+              for stratum, reservoir in reservoirs.items()}
+    quotas = {stratum: base + int(share) for stratum, share in shares.items()}
+    by_remainder = sorted(shares, key=lambda stratum: shares[stratum] - int(shares[stratum]), reverse=True)
+    for stratum in by_remainder[:count - sum(quotas.values())]:
+        quotas[stratum] += 1
+
+    cases = []
+    for stratum, reservoir in reservoirs.items():
+        # A reservoir is already a uniform sample, so any subset of it is too
+        cases += rng.sample(reservoir.items, min(quotas[stratum], len(reservoir.items)))
+    rng.shuffle(cases)
+    stats["strata"] = len(reservoirs)
+    stats["sampled"] = len(cases)
+    return cases, dict(stats)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a sample of production prompts against several Omni "
+                                                 "models and report how often they disagree.")
+    parser.add_argument("log", help="Prompt log: a .jsonl or .csv file, optionally .gz")
+    parser.add_argument("--model", action="append", required=True, dest="models",
+                        help="Model ID or Omni model URL; repeat for each model (at least two)")
+    parser.add_argument("--field", default="prompt", help="JSON key or CSV column holding the prompt")
+    parser.add_argument("--stratum-field", help="JSON key or CSV column to stratify the sample by, e.g. topic")
+    parser.add_argument("--sample", type=int, default=500, help="Number of unique prompts to replay")
+    parser.add_argument("--seed", type=int, help="Random seed, for a reproducible sample")
+    parser.add_argument("--expected-prompts", type=int, default=10_000_000,
+                        help="Unique prompts the dedup filter is sized for; more raises its false positive rate")
+    parser.add_argument("--topic", default=os.getenv("OMNI_TOPIC", "orders_ai"), help="Topic name for queries")
+    parser.add_argument("--base-url", default=os.getenv("OMNI_BASE_URL"), help="Omni base URL (default: $OMNI_BASE_URL)")
+    parser.add_argument("--workers", type=int, default=8, help="Maximum number of queries in flight")
+    parser.add_argument("--fixed-concurrency", action="store_true",
+                        help="Always keep --workers queries in flight instead of adapting to Omni's backpressure")
+    parser.add_argument("--output", help="Stream comparison records to this .jsonl or .parquet file")
+    parser.add_argument("--store", help="Also append records to this evaluation store (e.g. the app's evaluations.db)")
+    parser.add_argument("--max-disagreement", type=float, default=100.0,
+                        help="Exit non-zero if any pair of models disagrees on more than this %% of prompts")
+    parser.add_argument("--read-timeout", type=float, default=120.0, help="Read timeout for generate-query calls (s)")
+    parser.add_argument("--max-retries", type=int, default=3, help="Retries for 429 and 5xx responses")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the query and result cache")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    load_dotenv()
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+
+    api_key = os.getenv("OMNI_API_KEY")
+    if not api_key or not args.base_url:
+        print("OMNI_API_KEY and OMNI_BASE_URL (or --base-url) must be set", file=sys.stderr)
+        return 2
+
+    models = []
+    for i, model in enumerate(args.models):
+        model_id = extract_model_id_from_url(model) if "/models/" in model else model
+        if not model_id:
+            print(f"Invalid model ID or URL: {model}", file=sys.stderr)
+            return 2
+        models.append((model_label(i), model_id))
+    if len(models) < 2:
+        print("Replays compare models with each other, so give at least two --model", file=sys.stderr)
+        return 2
+
+    try:
+        prompts, stats = sample_prompts(args.log, args.sample, args.field, args.stratum_field, args.seed,
+                                        args.expected_prompts)
+    except (OSError, ValueError) as e:
+        print(f"Error reading {args.log}: {e}", file=sys.stderr)
+        return 2
+    print(f"Read {stats.get('lines', 0)} log records: {stats.get('unique', 0)} unique prompts, "
+          f"{stats.get('duplicates', 0)} duplicates, {stats.get('invalid', 0)} skipped; "
+          f"sampled {stats['sampled']} from {stats['strata']} strata")
+
+    # Imported here so sampling alone doesn't need the Omni SDK
+    from batch_eval import RecordWriter
+    from sharded_runner import build_evaluator
+    evaluator = build_evaluator({"base_url": args.base_url, "api_key": api_key, "topic_name": args.topic,
+                                 "pool_size": args.workers, "read_timeout": args.read_timeout,
+                                 "max_retries": args.max_retries, "cache_dir": ".cache/results",
+                                 "bypass_cache": args.no_cache, "adaptive": not args.fixed_concurrency})
+
+    writer = RecordWriter(args.output) if args.output else None
+    store = EvaluationStore(args.store) if args.store else None
+    run_id = store.start_run("replay", models) if store else None
+
+    compared, disagreed = Counter(), Counter()
+
+    def on_record(record):
+        # Tallied per pair overall, and per pair and stratum when stratified
+        keys = [(record["model"], None)] + ([(record["model"], record["stratum"])] if args.stratum_field else [])
+        for key in keys:
+            compared[key] += 1
+            if record["result"] != PASS:
+                disagreed[key] += 1
+        if writer:
+            writer.write(record)
+        if store:
+            store.append(record, run_id)
+
+    try:
+        evaluator.run_replay(prompts, models, max_workers=args.workers, on_record=on_record, keep_records=False)
+    finally:
+        if writer:
+            writer.close()
+
+    # Prompts where either model's query failed aren't compared, so rates are over compared prompts
+    failing = []
+    print(f"{'Models':<24} {'Stratum':<20} {'Compared':>9} {'Disagree':>9} {'Rate':>7}")
+    for pair, stratum in sorted(compared, key=lambda key: (key[0], key[1] is not None, str(key[1]))):
+        rate = disagreed[pair, stratum] / compared[pair, stratum] * 100
+        print(f"{pair:<24} {'(all)' if stratum is None else str(stratum):<20} {compared[pair, stratum]:>9} "
+              f"{disagreed[pair, stratum]:>9} {rate:>6.1f}%")
+        if stratum is None and rate > args.max_disagreement:
+            failing.append(pair)
+    if not compared:
+        print("No prompts could be compared; every replayed query failed for at least one model", file=sys.stderr)
+        return 1
+
+    if failing:
+        print(f"Disagreement above {args.max_disagreement:.1f}% for: {', '.join(failing)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pyarrow.parquet as pq
+
+
+def query_hash(query_dict):
+    """Canonical hash of a query dict, independent of key order."""
+    canonical = json.dumps(query_dict, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class QueryCache:
+    """Two-level cache for the evaluation pipeline.
+
+    Level one maps (topic, model ID, model version, prompt) to the generated query dict and
+    lives in memory, so editing a model stops its old queries from being used.
+    Level two maps the canonical hash of a query dict to its Arrow result table, stored as
+    Parquet files under cache_dir. Both levels are LRU-bounded and honour an optional TTL.
+    """
+
+    def __init__(self, cache_dir=".cache/results", max_queries=10000, max_results=2000,
+                 max_result_bytes=2 * 1024 ** 3, ttl=None):
+        self.cache_dir = cache_dir
+        self.max_queries = max_queries
+        self.max_results = max_results
+        self.max_result_bytes = max_result_bytes
+        self.ttl = ttl
+        self.stats = {"query_hits": 0, "query_misses": 0, "result_hits": 0, "result_misses": 0}
+
+        self._lock = threading.Lock()
+        self._queries = OrderedDict()   # key -> (created_at, query_dict)
+        self._results = OrderedDict()   # hash -> (created_at, size_bytes)
+        self._result_bytes = 0
+
+        # Rebuild the result index from disk, oldest first so LRU order survives restarts
+        os.makedirs(cache_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(cache_dir):
+            if name.endswith(".parquet"):
+                st = os.stat(os.path.join(cache_dir, name))
+                entries.append((st.st_mtime, name[:-len(".parquet")], st.st_size))
+        for mtime, key, size in sorted(entries):
+            self._results[key] = (mtime, size)
+            self._result_bytes += size
+
+    def _expired(self, created_at):
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def _result_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def _evict_result(self, key):
+        _, size = self._results.pop(key)
+        self._result_bytes -= size
+        try:
+            os.remove(self._result_path(key))
+        except FileNotFoundError:
+            pass
+
+    def get_query(self, topic_name, model_id, prompt, model_version=None):
+        """Return the cached query dict for a prompt, or None."""
+        key = (topic_name, model_id, model_version, prompt)
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is None or self._expired(entry[0]):
+                self._queries.pop(key, None)
+                self.stats["query_misses"] += 1
+                return None
+            self._queries.move_to_end(key)
+            self.stats["query_hits"] += 1
+            return entry[1]
+
+    def put_query(self, topic_name, model_id, prompt, query_dict, model_version=None):
+        key = (topic_name, model_id, model_version, prompt)
+        with self._lock:
+            self._queries[key] = (time.time(), query_dict)
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+
+    def get_result(self, query_dict):
+        """Return the cached Arrow result table for a query dict, or None."""
+        key = query_hash(query_dict)
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None and self._expired(entry[0]):
+                self._evict_result(key)
+                entry = None
+            if entry is None:
+                self.stats["result_misses"] += 1
+                return None
+            self._results.move_to_end(key)
+        try:
+            table = pq.read_table(self._result_path(key))
+        except (OSError, ValueError):
+            # File went missing or is corrupt; treat it as a miss
+            with self._lock:
+                if key in self._results:
+                    self._evict_result(key)
+                self.stats["result_misses"] += 1
+            return None
+        with self._lock:
+            self.stats["result_hits"] += 1
+        return table
+
+    def put_result(self, query_dict, table):
+        key = query_hash(query_dict)
+        path = self._result_path(key)
+        # Write to a temp file first so readers (in any process) never see a half-written Parquet file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            if key in self._results:
+                self._result_bytes -= self._results[key][1]
+            self._results[key] = (time.time(), size)
+            self._results.move_to_end(key)
+            self._result_bytes += size
+            while self._results and (len(self._results) > self.max_results
+                                     or self._result_bytes > self.max_result_bytes):
+                self._evict_result(next(iter(self._results)))
+
+    def clear(self):
+        with self._lock:
+            self._queries.clear()
+            for key in list(self._results):
+                self._evict_result(key)
+            for key in self.stats:
+                self.stats[key] = 0
@@ -0,0 +1,205 @@
+"""Run a suite's question x model matrix across several worker processes.
+
+The parent process splits the suite into shards of consecutive questions and feeds them
+through a local work queue; each worker process builds its own Evaluator and runs whole
+shards (every model for those questions, so identical queries are still shared). Records
+come back on a result queue and are merged in the parent, where the store lives.
+"""
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import threading
+import traceback
+
+from omni_python_sdk import OmniAPI
+
+from concurrency import ConcurrencyController
+from evaluation import Evaluator
+from evaluation_store import ResultBlobStore
+from omni_http import OmniHTTPClient
+from query_cache import QueryCache
+
+
+def build_evaluator(config):
+    """Build an Evaluator from a picklable settings dict, e.g. in a worker process.
+
+    Keys: base_url, topic_name and optionally api_key (default $OMNI_API_KEY), pool_size,
+    read_timeout, max_retries, cache_dir (None disables the cache), cache_ttl,
+    bypass_cache, results_dir and adaptive (adapt concurrency to backpressure, up to pool_size).
+    """
+    api_key = config.get("api_key") or os.getenv("OMNI_API_KEY")
+    http_client = OmniHTTPClient(config["base_url"], api_key, pool_size=config.get("pool_size", 8),
+                                 read_timeout=config.get("read_timeout", 120.0),
+                                 max_retries=config.get("max_retries", 3))
+    cache = QueryCache(config["cache_dir"], ttl=config.get("cache_ttl")) if config.get("cache_dir") else None
+    blobs = ResultBlobStore(config["results_dir"]) if config.get("results_dir") else None
+    limits = ConcurrencyController(max_limit=config.get("pool_size", 8)) if config.get("adaptive") else None
+    return Evaluator(http_client, OmniAPI(api_key, base_url=config["base_url"]), config["topic_name"],
+                     cache=cache, bypass_cache=config.get("bypass_cache", False), blobs=blobs,
+                     worker_config=config, limits=limits)
+
+
+class ShardError(RuntimeError):
+    """A worker process failed; carries the worker's traceback."""
+
+
+def _worker(config, models, max_workers, tasks, results, resume, cancel):
+    """Worker process: run shards from the task queue until it hands out None.
+
+    If anything fails, a ShardError with the traceback is sent before the closing None.
+    Warnings and errors from the evaluation logger are sent too, to be logged in the parent.
+    """
+    forward = logging.handlers.QueueHandler(results)
+    forward.setLevel(logging.WARNING)
+    logging.getLogger("evaluation").addHandler(forward)
+
+    def gate():
+        resume.wait()
+        return not cancel.is_set()
+
+    try:
+        evaluator = build_evaluator(config)
+        while True:
+            shard = tasks.get()
+            if shard is None:
+                break
+            first_question, questions, skip = shard
+            offset = first_question * len(models)
+            evaluator.run_suite(questions, models, max_workers=max_workers, skip=skip, gate=gate,
+                                on_task=lambda index, record: results.put((offset + index, record)),
+                                keep_records=False)
+    except BaseException:
+        results.put(ShardError(f"Suite worker process failed:\n{traceback.format_exc()}"))
+        raise
+    finally:
+        results.put(None)
+
+
+def _shards(questions, shard_size):
+    shard, first_question = [], 0
+    for i, question_data in enumerate(questions):
+        if not shard:
+            first_question = i
+        shard.append(question_data)
+        if len(shard) >= shard_size:
+            yield first_question, shard
+            shard = []
+    if shard:
+        yield first_question, shard
+
+
+def run_sharded(evaluator, questions, models, processes=4, max_workers=8, on_progress=None, on_record=None,
+                skip=(), on_task=None, resume=None, cancel=None, shard_size=25, reuse=None):
+    """Like Evaluator.run_suite, but spread over processes worker processes.
+
+    The evaluator must have been built with a worker_config, which each worker uses to
+    build its own. max_workers is the number of queries in flight per process. Callbacks
+    run in the calling process as records arrive, in completion order. resume and cancel
+    are multiprocessing Events (from the spawn context) used to pause and cancel workers:
+    tasks wait while resume is clear and are dropped once cancel is set. Workers' warnings
+    and errors are logged again here, as if from the calling thread. Reuse lookups (see
+    Evaluator.reused_record) are done here in the parent, so only pairs that have to run are
+    sent to the workers. If a worker fails, the run is cancelled and the worker's error is
+    raised here as a ShardError, as run_suite would raise it.
+    """
+    if evaluator.worker_config is None:
+        raise ValueError("Sharded runs need an evaluator built with a worker_config")
+    context = multiprocessing.get_context("spawn")
+    if resume is None:
+        resume = context.Event()
+        resume.set()
+    if cancel is None:
+        cancel = context.Event()
+
+    total = len(questions) * len(models) if hasattr(questions, "__len__") else None
+    skip = set(skip)
+    tasks = context.Queue(maxsize=2 * processes)
+    results = context.Queue()
+    workers = [context.Process(target=_worker, daemon=True, name=f"suite-shard-{i}",
+                               args=(evaluator.worker_config, models, max_workers, tasks, results, resume, cancel))
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+
+    feed_error = []
+    reused = queue.Queue()
+
+    def feed():
+        # Streams the suite into the bounded queue, so large suites never sit in memory
+        try:
+            for first_question, shard in _shards(questions, shard_size):
+                offset = first_question * len(models)
+                shard_skip = {i - offset for i in range(offset, offset + len(shard) * len(models)) if i in skip}
+                if reuse is not None:
+                    for question_index, question_data in enumerate(shard):
+                        for model_index, (label, model_id) in enumerate(models):
+                            index = question_index * len(models) + model_index
+                            record = None if index in shard_skip else evaluator.reused_record(
+                                question_data, label, model_id, reuse)
+                            if record is not None:
+                                reused.put((offset + index, record))
+                                shard_skip.add(index)
+                if len(shard_skip) < len(shard) * len(models):
+                    tasks.put((first_question, shard, shard_skip))
+        except Exception as e:
+            feed_error.append(e)
+        finally:
+            for _ in workers:
+                tasks.put(None)
+
+    feeder = threading.Thread(target=feed, name="suite-shard-feeder", daemon=True)
+    feeder.start()
+
+    done, finished = len(skip), 0
+    try:
+        while finished < len(workers) or not reused.empty():
+            # Reused records come straight from the feeder thread rather than from a worker
+            items = []
+            while not reused.empty():
+                items.append(reused.get_nowait())
+            if not items:
+                try:
+                    items.append(results.get(timeout=0.1))
+                except queue.Empty:
+                    if finished < len(workers) and not any(worker.is_alive() for worker in workers):
+                        raise RuntimeError("Suite worker processes exited before finishing")
+                    continue
+            for item in items:
+                if isinstance(item, ShardError):
+                    raise item
+                if isinstance(item, logging.LogRecord):
+                    # Attribute it to this thread, so per-job log handlers pick it up
+                    item.threadName = threading.current_thread().name
+                    logging.getLogger(item.name).handle(item)
+                    continue
+                if item is None:
+                    finished += 1
+                    continue
+                index, record = item
+                done += 1
+                if on_task:
+                    on_task(index, record)
+                if on_record and record is not None:
+                    on_record(record)
+                if on_progress and total:
+                    on_progress(done / total)
+    except BaseException:
+        # Release paused or running workers so they can be shut down
+        cancel.set()
+        resume.set()
+        raise
+    finally:
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+    feeder.join(timeout=5)
+    if feed_error:
+        raise feed_error[0]
+    # A worker that died without reporting (e.g. killed) may have dropped tasks
+    failed = [f"{worker.name} (exit code {worker.exitcode})" for worker in workers if worker.exitcode != 0]
+    if failed:
+        raise ShardError(f"Suite worker processes exited with errors: {', '.join(failed)}")
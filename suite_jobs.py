@@ -0,0 +1,239 @@
+"""Background suite runs that checkpoint every task, so they survive reruns and restarts."""
+import logging
+import multiprocessing
+import threading
+import time
+from collections import deque
+
+from compiled_suite import open_suite
+from evaluation import compile_case
+from prompt_logs import sample_prompts
+
+logger = logging.getLogger(__name__)
+
+
+class JobLogHandler(logging.Handler):
+    """Keeps the recent warnings and errors logged by one job's threads."""
+
+    def __init__(self, thread_name, max_messages=100):
+        super().__init__(logging.WARNING)
+        self.thread_name = thread_name
+        self.messages = deque(maxlen=max_messages)
+
+    def emit(self, record):
+        # The job's pool threads are named after its thread (see evaluation._run_bounded)
+        if record.threadName.startswith(self.thread_name):
+            self.messages.append(f"{time.strftime('%H:%M:%S', time.localtime(record.created))} "
+                                 f"{record.levelname}: {self.format(record)}")
+
+
+class SuiteJob:
+    """A suite run on a background thread, checkpointed in the store after every question and model.
+
+    With kind "replay" it's a production prompt replay instead (see Evaluator.run_replay),
+    checkpointed after every prompt. A replay can be given sample, the sample_prompts
+    arguments, instead of questions; the log is then sampled on the job's thread first.
+    """
+
+    def __init__(self, run_id, evaluator, store, questions, models, max_workers=8, on_finish=None, processes=1,
+                 changed_only=False, kind="suite", sample=None):
+        self.run_id = run_id
+        self.evaluator = evaluator
+        self.store = store
+        self.questions = questions
+        self.models = models
+        self.max_workers = max_workers
+        self.processes = processes
+        # Reuse stored results for test cases and models that haven't changed since their last run
+        self.changed_only = changed_only
+        self.on_finish = on_finish
+        self.kind = kind
+        self.sample = sample
+        self.sample_stats = None
+        if questions is None:
+            self.total = 0
+        else:
+            self.total = len(questions) if kind == "replay" else len(questions) * len(models)
+        self.completed = 0
+        self.failed = 0
+        self.status = "running"
+        self.error = None
+
+        # Sharded runs pause and cancel their worker processes through the same events
+        events = multiprocessing.get_context("spawn") if processes > 1 else threading
+        self._resume = events.Event()
+        self._resume.set()
+        self._cancel = events.Event()
+        self._thread = threading.Thread(target=self._run, name=f"suite-job-{run_id}", daemon=True)
+        # Failed queries are logged rather than raised, so keep the messages to show with the job
+        self._log = JobLogHandler(self._thread.name)
+
+    @property
+    def messages(self):
+        """Recent warnings and errors from this job, oldest first."""
+        return list(self._log.messages)
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def start(self):
+        self._thread.start()
+
+    def pause(self):
+        """Stop starting new tasks; queries already in flight still finish."""
+        if self.status == "running":
+            self._resume.clear()
+            self._set_status("paused")
+
+    def resume(self):
+        if self.status == "paused":
+            self._set_status("running")
+            self._resume.set()
+
+    def cancel(self):
+        self._cancel.set()
+        self._resume.set()
+        self.status = "cancelling"
+
+    def _set_status(self, status):
+        self.status = status
+        self.store.set_job_status(self.run_id, status)
+
+    def _gate(self):
+        self._resume.wait()
+        return not self._cancel.is_set()
+
+    def _on_task(self, index, record):
+        self.store.complete_task(self.run_id, index, record)
+        self.completed += 1
+        if not record:
+            self.failed += 1
+
+    def _sample(self):
+        """Sample the replay's prompts from its log, and checkpoint them so a resumed job doesn't sample again."""
+        self.status = "sampling"
+        self.questions, self.sample_stats = sample_prompts(**self.sample)
+        self.total = len(self.questions)
+        spec = dict(self.store.get_job(self.run_id)["spec"], questions=self.questions, sample_stats=self.sample_stats)
+        self.store.save_job(self.run_id, spec, self.total)
+        if self.status == "sampling":
+            self.status = "running"
+
+    def _run(self):
+        skip = self.store.completed_tasks(self.run_id)
+        self.completed = len(skip)
+        reuse = self.store.reusable_record if self.changed_only else None
+        evaluation_logger = logging.getLogger("evaluation")
+        evaluation_logger.addHandler(self._log)
+        try:
+            if self.questions is None:
+                self._sample()
+            if self.kind == "replay":
+                self.evaluator.run_replay(self.questions, self.models, max_workers=self.max_workers, skip=skip,
+                                          on_task=self._on_task, gate=self._gate, keep_records=False)
+            elif self.processes > 1:
+                # Only multi-process runs need the sharded runner
+                from sharded_runner import run_sharded
+                run_sharded(self.evaluator, self.questions, self.models, processes=self.processes,
+                            max_workers=self.max_workers, skip=skip, on_task=self._on_task,
+                            resume=self._resume, cancel=self._cancel, reuse=reuse)
+            else:
+                self.evaluator.run_suite(self.questions, self.models, max_workers=self.max_workers,
+                                         skip=skip, on_task=self._on_task, gate=self._gate, keep_records=False,
+                                         reuse=reuse)
+        except Exception as e:
+            logger.exception(f"Suite run {self.run_id} failed")
+            self.error = str(e)
+            self._set_status("failed")
+        else:
+            self._set_status("cancelled" if self._cancel.is_set() else "done")
+        finally:
+            evaluation_logger.removeHandler(self._log)
+        if self.on_finish:
+            try:
+                self.on_finish(self)
+            except Exception:
+                logger.exception(f"Finish hook for suite run {self.run_id} failed")
+
+
+class JobManager:
+    """Process-wide registry of suite jobs, so any rerun or session can attach to them."""
+
+    def __init__(self, store, on_finish=None):
+        self.store = store
+        self.on_finish = on_finish
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, evaluator, questions, models, max_workers=8, processes=1, changed_only=False, kind="suite",
+              sample=None):
+        """Register and start a new job for a suite; returns the job.
+
+        questions is a list of test cases or a suite opened from a file; file-backed suites
+        are checkpointed by path rather than copied into the job spec. With processes > 1
+        the suite is sharded across worker processes (see sharded_runner). With changed_only
+        only new or changed test case and model pairs are run; the rest reuse stored results.
+        With kind "replay", questions are sampled production prompts (see prompt_logs) and
+        every pair of models is compared instead; processes and changed_only don't apply.
+        A replay can pass questions=None and sample, the sample_prompts arguments (including
+        a seed, so a job resumed before sampling finished draws the same prompts).
+        """
+        run_id = self.store.start_run(kind, models)
+        spec = {"topic_name": evaluator.topic_name, "models": models, "max_workers": max_workers,
+                "processes": processes, "changed_only": changed_only, "kind": kind}
+        if sample is not None:
+            spec["sample"] = sample
+        elif getattr(questions, "path", None):
+            spec["suite_path"] = questions.path
+        else:
+            spec["questions"] = [{k: q[k] for k in ("question", "expected_response", "stratum") if k in q}
+                                 for q in questions]
+        job = SuiteJob(run_id, evaluator, self.store, questions, models, max_workers, on_finish=self.on_finish,
+                       processes=processes, changed_only=changed_only, kind=kind, sample=sample)
+        self.store.save_job(run_id, spec, job.total)
+        return self._launch(job)
+
+    def resume(self, run_id, make_evaluator):
+        """Restart a checkpointed job that isn't running in this process, skipping finished tasks.
+
+        make_evaluator is called with the job's topic name and returns the Evaluator to use.
+        """
+        live = self.get(run_id)
+        if live is not None and live.running:
+            return live
+        job_info = self.store.get_job(run_id)
+        if job_info is None:
+            return None
+
+        spec = job_info["spec"]
+        kind = spec.get("kind", "suite")
+        if "suite_path" in spec:
+            questions = open_suite(spec["suite_path"])
+        elif kind == "replay":
+            # None if the job stopped while still sampling its log
+            questions = spec.get("questions")
+        else:
+            questions = [compile_case(q["question"], q["expected_response"]) for q in spec["questions"]]
+        models = [tuple(model) for model in spec["models"]]
+        self.store.set_job_status(run_id, "running")
+        job = SuiteJob(run_id, make_evaluator(spec["topic_name"]), self.store, questions, models,
+                       spec["max_workers"], on_finish=self.on_finish, processes=spec.get("processes", 1),
+                       changed_only=spec.get("changed_only", False), kind=kind, sample=spec.get("sample"))
+        job.sample_stats = spec.get("sample_stats")
+        return self._launch(job)
+
+    def _launch(self, job):
+        with self._lock:
+            self._jobs[job.run_id] = job
+        job.start()
+        return job
+
+    def get(self, run_id):
+        with self._lock:
+            return self._jobs.get(run_id)
+
+    def live_jobs(self):
+        """Jobs whose thread is still running in this process."""
+        with self._lock:
+            return [job for job in self._jobs.values() if job.running]
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+from evaluation import SharedExecutions, compare_results, compile_case, diff_results, table_fingerprint
+
+
+def test_rows_in_any_order_match():
+    result = pa.table({"id": [1, 2, 3], "name": ["a", "b", "c"]})
+    expected = pd.DataFrame({"name": ["c", "a", "b"], "id": ["3", "1", "2"]})
+    assert compare_results(result, expected)
+
+
+def test_changed_row_fails():
+    result = pa.table({"id": [1, 2, 3]})
+    assert not compare_results(result, pd.DataFrame({"id": [1, 2, 4]}))
+    assert not compare_results(result, pd.DataFrame({"id": [1, 2]}))
+    assert not compare_results(result, pd.DataFrame({"other": [1, 2, 3]}))
+
+
+def test_numbers_match_within_tolerance():
+    assert compare_results(pa.table({"a": [1.0000005]}), pd.DataFrame({"a": [1.0000004999]}))
+    assert compare_results(pa.table({"a": [0.1 + 0.2]}), pd.DataFrame({"a": [0.3]}))
+    assert not compare_results(pa.table({"a": [1.0]}), pd.DataFrame({"a": [1.001]}))
+
+
+def test_float_noise_doesnt_reorder_other_columns():
+    result = pa.table({"amount": [1.0, 1.0 + 1e-12], "name": ["y", "x"]})
+    expected = pd.DataFrame({"amount": [1.0 + 1e-12, 1.0], "name": ["y", "x"]})
+    assert compare_results(result, expected)
+
+
+def test_nan_and_null_match():
+    result = pa.table({"a": [1.0, None], "b": ["x", "y"]})
+    expected = pd.DataFrame({"a": [float("nan"), 1.0], "b": ["y", "x"]})
+    assert compare_results(result, expected)
+
+
+def test_dates_match_date_strings():
+    result = pd.DataFrame({"d": pd.to_datetime(["2024-01-01", "2024-02-01"])})
+    assert compare_results(result, pd.DataFrame({"d": ["2024-02-01", "2024-01-01"]}))
+
+
+def test_fingerprint_rejects_changed_text_but_not_float_noise():
+    case = compile_case("q", '[{"a": 1.0000004999, "b": "x"}]')
+    fingerprint = case["fingerprint"]
+    assert fingerprint == table_fingerprint(pa.table({"a": [1.0000004999], "b": ["x"]}))
+    assert compare_results(pa.table({"a": [1.0000005], "b": ["x"]}), case["parsed_response"], fingerprint)
+    assert not compare_results(pa.table({"a": [1.0000005], "b": ["y"]}), case["parsed_response"], fingerprint)
+
+
+def test_diff_lists_unexpected_and_missing_rows():
+    diff = diff_results(pa.table({"a": [1, 2, 3]}), pd.DataFrame({"a": [1, 2, 4]}))
+    assert diff.to_dict("records") == [{"a": 3, "_diff": "unexpected"}, {"a": 4, "_diff": "missing"}]
+    assert diff_results(pa.table({"a": [1]}), pd.DataFrame({"b": [1]})) is None
+
+
+def test_single_value_answers_compare_as_scalars():
+    case = compile_case("q", "1")
+    assert case["parsed_response"] == "1"
+    assert compare_results(pa.table({"count": [1.0]}), case["parsed_response"])
+    assert not compare_results(pa.table({"count": [2.0]}), case["parsed_response"])
+    assert isinstance(compile_case("q", "a,b\n1,x")["parsed_response"], pa.Table)
+
+
+def test_shared_executions_are_bounded():
+    shared = SharedExecutions(max_entries=10)
+    for i in range(100):
+        assert shared.run(i, lambda: {"query": i}) == ({"query": i}, False)
+    assert len(shared._results) == 10
+    assert shared.run(99, lambda: None) == ({"query": 99}, True)
+
+    shared = SharedExecutions(max_bytes=1000)
+    for i in range(10):
+        shared.run(i, lambda: pa.table({"a": list(range(100))}))
+    assert shared._bytes <= 1000
+
+
+def test_unkept_results_are_only_shared_while_running():
+    shared, started, release = SharedExecutions(), threading.Event(), threading.Event()
+
+    def execute():
+        started.set()
+        release.wait()
+        return "query"
+
+    owner = threading.Thread(target=shared.run, args=("k", execute), kwargs={"keep": False})
+    owner.start()
+    started.wait()
+    waiter = []
+    thread = threading.Thread(target=lambda: waiter.append(shared.run("k", lambda: "again", keep=False)))
+    thread.start()
+    while not shared.saved:
+        time.sleep(0.01)
+    release.set()
+    owner.join()
+    thread.join()
+    assert waiter == [("query", True)]
+    assert shared.run("k", lambda: "again", keep=False) == ("again", False)
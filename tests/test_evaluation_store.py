@@ -0,0 +1,90 @@
+import os
+import threading
+
+import pyarrow as pa
+
+from evaluation import FAIL, PASS
+from evaluation_store import EvaluationStore, ResultBlobStore
+
+
+def record(prompt, model, model_id, result):
+    return {"timestamp": "2026-01-01 00:00:00", "kind": "suite", "model": model, "model_id": model_id,
+            "prompt": prompt, "result": result, "generate_latency_s": 1.0}
+
+
+def test_question_summary_for_one_run_and_model():
+    store = EvaluationStore(":memory:")
+    first = store.start_run("suite")
+    store.append_many([record("q1", "Model A", "m1", PASS), record("q2", "Model A", "m1", FAIL)], first)
+    second = store.start_run("suite")
+    store.append_many([record("q1", "Model A", "m2", FAIL), record("q1", "Model B", "m1", PASS)], second)
+
+    page, total = store.question_summary(kind="suite")
+    assert total == 2
+    assert sorted(zip(page["scope_key"], page["model"], page["model_id"], page["total"])) == [
+        ("q1", "Model A", "m1", 1), ("q1", "Model A", "m2", 1), ("q1", "Model B", "m1", 1), ("q2", "Model A", "m1", 1)]
+
+    page, total = store.question_summary(kind="suite", run_id=second)
+    assert total == 1
+    assert list(zip(page["model"], page["model_id"], page["passed"], page["failed"])) == [
+        ("Model A", "m2", 0, 1), ("Model B", "m1", 1, 0)]
+
+    page, total = store.question_summary(kind="suite", model_id="m1", run_id=first, limit=1, offset=1)
+    assert (total, page["scope_key"].tolist()) == (2, ["q2"])
+    assert store.question_summary(kind="suite", model_id="m2")[0]["model_id"].tolist() == ["m2"]
+
+
+def test_summary_rebuilt_from_records():
+    store = EvaluationStore(":memory:")
+    run_id = store.start_run("suite")
+    store.append_many([record("q1", "Model A", "m1", PASS), record("q1", "Model A", "m1", FAIL)], run_id)
+    before = store.question_summary(kind="suite")[0]
+    with store._conn:
+        store._rebuild_summary()
+    assert store.question_summary(kind="suite")[0].equals(before)
+
+
+def test_blobs_are_stored_once_and_evicted_oldest_first(tmp_path):
+    blobs = ResultBlobStore(str(tmp_path), max_blobs=2)
+    first = blobs.save(pa.table({"a": [1]}))
+    assert blobs.save(pa.table({"a": [1]})) == first
+    second = blobs.save(pa.table({"a": [2]}))
+    third = blobs.save(pa.table({"a": [3]}))
+    assert blobs.load(first) is None
+    assert blobs.load(second).equals(pa.table({"a": [2]})) and blobs.load(third) is not None
+    assert sorted(os.listdir(tmp_path)) == sorted([f"{second}.arrow", f"{third}.arrow"])
+
+
+def test_blob_evicted_by_another_process_while_saving_is_written_again(tmp_path, monkeypatch):
+    blobs = ResultBlobStore(str(tmp_path))
+    blob_id = blobs.save(pa.table({"a": [1]}))
+    utime = os.utime
+
+    def evicted_first(path, *args, **kwargs):
+        if os.path.exists(path):
+            os.remove(path)
+        return utime(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, "utime", evicted_first)
+    assert blobs.save(pa.table({"a": [1]})) == blob_id
+    monkeypatch.undo()
+    assert blobs.load(blob_id).equals(pa.table({"a": [1]}))
+
+
+def test_concurrent_saves_with_eviction(tmp_path):
+    blobs, errors = ResultBlobStore(str(tmp_path), max_blobs=3), []
+
+    def save_all():
+        try:
+            for i in range(200):
+                blobs.save(pa.table({"a": [i % 5]}))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save_all) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(os.listdir(tmp_path)) <= 3
@@ -0,0 +1,46 @@
+import pyarrow as pa
+
+from evaluation import Evaluator
+from query_cache import QueryCache
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+        self.status_code = 200
+        self.content = b"{}"
+
+    def json(self):
+        return self.data
+
+
+class FakeHTTPClient:
+    """Generates a query naming the model's current YAML version."""
+
+    def __init__(self):
+        self.yaml = {"version": 1}
+        self.generated = 0
+
+    def model_yaml(self, model_id):
+        return Response(dict(self.yaml)), 0, 0.0
+
+    def generate_query(self, topic_name, model_id, prompt):
+        self.generated += 1
+        return Response({"model": model_id, "yaml": self.yaml["version"]}), 0, 0.0
+
+
+class FakeOmniClient:
+    def run_query_blocking(self, query_dict):
+        return pa.table({"yaml": [query_dict["yaml"]]}), None
+
+
+def test_edited_model_doesnt_reuse_cached_queries(tmp_path):
+    http_client, cache = FakeHTTPClient(), QueryCache(str(tmp_path))
+    table, _ = Evaluator(http_client, FakeOmniClient(), "topic", cache=cache).query_data("q", "m")
+    table, _ = Evaluator(http_client, FakeOmniClient(), "topic", cache=cache).query_data("q", "m")
+    assert http_client.generated == 1
+
+    http_client.yaml = {"version": 2}
+    table, _ = Evaluator(http_client, FakeOmniClient(), "topic", cache=cache).query_data("q", "m")
+    assert http_client.generated == 2
+    assert table.column("yaml").to_pylist() == [2]
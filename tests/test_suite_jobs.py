@@ -0,0 +1,40 @@
+from evaluation_store import EvaluationStore
+from suite_jobs import JobManager
+
+
+class FlakyEvaluator:
+    """Fails every question it's told to, as if Omni were down for them."""
+
+    topic_name = "topic"
+
+    def __init__(self, failing):
+        self.failing = failing
+        self.ran = []
+
+    def run_suite(self, questions, models, skip=(), on_task=None, gate=None, **kwargs):
+        for index, question in enumerate(questions):
+            if index in skip or not gate():
+                continue
+            self.ran.append(index)
+            record = None if question["question"] in self.failing else {
+                "timestamp": "2026-01-01 00:00:00", "kind": "suite", "model": "Model A", "model_id": "m",
+                "prompt": question["question"], "result": "✅ PASS"}
+            on_task(index, record)
+
+
+def test_resume_reruns_failed_tasks():
+    store = EvaluationStore(":memory:")
+    questions = [{"question": f"q{i}", "expected_response": "1"} for i in range(4)]
+    manager = JobManager(store)
+    job = manager.start(FlakyEvaluator({"q2", "q3"}), questions, [("Model A", "m")])
+    job._thread.join()
+    assert (job.status, job.completed, job.failed) == ("done", 4, 2)
+    assert store.unfinished_jobs() == [job.run_id]
+    assert store.get_job(job.run_id)["completed"] == 2
+
+    retry = FlakyEvaluator(set())
+    job = manager.resume(job.run_id, lambda topic: retry)
+    job._thread.join()
+    assert retry.ran == [2, 3]
+    assert (job.status, job.completed, job.failed) == ("done", 4, 0)
+    assert store.unfinished_jobs() == []